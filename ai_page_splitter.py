@@ -5,76 +5,759 @@ AI智能分页模块
 将用户输入的长文本智能分割为适合PPT展示的多个页面
 """
 
+import os
 import re
+import copy
+import gzip
+import bisect
 import json
+import time
+import hashlib
+import itertools
+import queue
+import asyncio
+import functools
+import threading
+import contextlib
+import httpx
 import requests
-from typing import Dict, List, Any, Optional, Tuple
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple, Union, Callable, Awaitable, Iterator, AsyncIterator, TypedDict, NotRequired
+from openai import OpenAI, AsyncOpenAI, RateLimitError, DefaultHttpxClient, DefaultAsyncHttpxClient
 from config import get_config
-from logger import log_user_action
+from async_logger import enqueue
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  httpx启用HTTP/2所需
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 提示词文本存放在prompts目录，模块加载时读取一次
+_PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+
+def _load_prompt(filename: str) -> str:
+    """读取prompts目录下的提示词文件（去掉文件末尾换行，保持与原内嵌文本一致）"""
+    with open(os.path.join(_PROMPTS_DIR, filename), 'r', encoding='utf-8') as f:
+        return f.read().rstrip('\n')
+
+
+# 第一次调用的提示词不含任何变量，模块加载时构建一次即可
+_LOGICAL_STRUCTURE_PROMPT = _load_prompt('logical_structure.txt')
+
+# 第二次调用（指定页数）的静态提示词主体；具体页数由_TARGET_PAGES_INSTRUCTION追加在末尾，
+# 保证不同页数请求共享同一前缀，从而命中服务端的提示词前缀缓存
+_PAGE_ADJUSTMENT_PROMPT = _load_prompt('page_adjustment.txt')
+
+# 第二次调用（未指定目标页数）：合并内容页，减少过度分页
+_PAGE_OPTIMIZATION_PROMPT = _load_prompt('page_optimization.txt')
+
+_TARGET_PAGES_INSTRUCTION = """
+
+【目标页数】用户要求PPT总共{target_pages}页：你必须生成第1页到第{ai_pages}页共{ai_pages}页内容，系统会自动添加第{target_pages}页结尾页。"""
+
+
+class AnalysisDict(TypedDict):
+    """分页结果中的analysis部分"""
+    total_pages: int
+    content_type: str
+    split_strategy: str
+    reasoning: NotRequired[str]
+
+
+class PageDict(TypedDict):
+    """分页结果中的单个页面"""
+    page_number: int
+    page_type: str
+    title: str
+    original_text_segment: str
+    date: NotRequired[str]
+
+
+class SplitResultDict(TypedDict):
+    """split_text_to_pages返回的分页结果"""
+    success: bool
+    analysis: AnalysisDict
+    pages: List[PageDict]
+    is_fallback: NotRequired[bool]
+    is_two_pass_result: NotRequired[bool]
+    first_pass_pages: NotRequired[int]
+    final_pass_pages: NotRequired[int]
+
+
+def _required_fields(schema: type) -> Tuple[str, ...]:
+    """按声明顺序取出TypedDict的必需字段"""
+    return tuple(name for name in schema.__annotations__ if name in schema.__required_keys__)
+
+
+# 分页结果的必需字段由上面的结构定义导出（元组保留报错顺序，frozenset用于一次性子集检查）
+_REQUIRED_ANALYSIS_FIELDS = _required_fields(AnalysisDict)
+_REQUIRED_ANALYSIS_FIELD_SET = frozenset(_REQUIRED_ANALYSIS_FIELDS)
+_REQUIRED_PAGE_FIELDS = _required_fields(PageDict)
+_REQUIRED_PAGE_FIELD_SET = frozenset(_REQUIRED_PAGE_FIELDS)
+
+# 分页结果缓存：最多缓存的条目数和有效期（秒）
+_CACHE_MAX_ENTRIES = 1024
+_CACHE_TTL_SECONDS = 3600
+# 缓存总大小上限（按结果的JSON编码字节数估算），长文档较多时以此约束内存占用
+_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 含时效性词语的文本不缓存（同样的文字在不同时间应得到不同结果）
+_CACHE_EXCLUDE_RE = re.compile(r'今天|现在|最新')
+# 缓存键归一化时合并连续空行
+_CACHE_BLANK_LINES_RE = re.compile(r'\n{3,}')
+# 第一次调用结果与最终结果共用缓存，以该标记代替目标页数区分缓存键
+_FIRST_PASS_CACHE_TAG = 'first_pass'
+
+# 备用分页的段落分隔：连续多个空行视为一个分隔，不产生空段落
+_PARA_SPLIT_RE = re.compile(r'\n\n+')
+
+# 备用分页最多生成的内容页数（第3~23页，为目录页和结尾页预留空间）
+_FALLBACK_MAX_CONTENT_PAGES = 21
+
+# 固定目录页和结尾页使用的模板路径
+_TOC_TEMPLATE_PATH = os.path.join("templates", "table_of_contents_slides.pptx")
+_ENDING_TEMPLATE_PATH = os.path.join("templates", "ending_slides.pptx")
+
+# 固定目录页和结尾页的公共字段（每次按模板浅拷贝，只填入页码和目录项）
+_TOC_PAGE_TEMPLATE = {
+    "page_number": 2,
+    "page_type": "table_of_contents",
+    "title": "目录",
+    "original_text_segment": "",
+    "template_path": _TOC_TEMPLATE_PATH,
+    "is_toc_page": True,  # 标记为目录页
+    "skip_dify_api": True,  # 不需要调用Dify API，但内容已动态提取
+    "toc_items": None
+}
+_ENDING_PAGE_TEMPLATE = {
+    "page_number": None,
+    "page_type": "ending",
+    "title": "谢谢观看",
+    "original_text_segment": "",
+    "template_path": _ENDING_TEMPLATE_PATH,
+    "is_fixed_template": True,
+    "skip_dify_api": True  # 标记为跳过Dify API调用
+}
+
+# 截断文本时追加的省略号
+_TRUNC_SUFFIX = "..."
+
+
+def _normalize_cache_text(text: str) -> str:
+    """
+    归一化用于计算缓存键的文本：去掉每行首尾空白、统一换行符、合并多余空行
+
+    只影响缓存键，调用AI时仍使用原文；仅格式不同的重复输入可以命中同一条缓存
+    """
+    lines = '\n'.join(line.strip() for line in text.splitlines())
+    return _CACHE_BLANK_LINES_RE.sub('\n\n', lines).strip()
+
+
+def _json_preview(obj: Any, limit: int) -> str:
+    """
+    返回缩进格式JSON的前limit个字符，与json.dumps(obj, ensure_ascii=False, indent=2)[:limit]一致
+
+    逐段编码，够长即停，大结果出错时不必序列化全部内容
+    """
+    parts = []
+    length = 0
+    for chunk in json.JSONEncoder(ensure_ascii=False, indent=2).iterencode(obj):
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= limit:
+            break
+    return "".join(parts)[:limit]
+
+
+def _truncate(text: str, limit: int, keep: Optional[int] = None) -> str:
+    """文本超过limit个字符时保留前keep个字符（默认与limit相同）并追加省略号，否则原样返回"""
+    if len(text) <= limit:
+        return text
+    return text[:limit if keep is None else keep] + _TRUNC_SUFFIX
+
+
+# 多文档合并请求时追加在系统提示词末尾的说明（保持原提示词前缀不变）
+_MULTI_DOCUMENT_INSTRUCTION = """
+
+【多文档模式】本次用户输入包含多个相互独立的文档，格式为JSON：{"documents": [{"id": 文档编号, "text": 文档内容}]}
+- 请对每个文档分别独立执行上述全部要求，不同文档的内容不能混合
+- 返回格式改为以下JSON对象，其中每个文档的pages即上面要求的页面数组：
+
+```json
+{"results": [{"id": 文档编号, "pages": [...]}]}
+```
+
+只返回JSON，不要其他文字。"""
+
+
+def _json_loads(data):
+    """解析JSON，优先使用orjson（C实现，解析大段AI回复更快），不可用时回退到标准库"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """编码为UTF-8 JSON字节，优先使用orjson，不可用时回退到标准库（中文不转义）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _encode_json_body(payload: Dict[str, Any], compress: bool = False) -> Tuple[bytes, Dict[str, str]]:
+    """
+    把请求体编码为UTF-8 JSON字节（中文不转义为\\uXXXX，体积约为默认编码的一半），返回(请求体, 附加请求头)
+
+    compress=True时再以gzip压缩并附加Content-Encoding头（需服务端支持）
+    """
+    body = _json_dumps(payload)
+    if compress:
+        return gzip.compress(body, compresslevel=3), {'Content-Encoding': 'gzip'}
+    return body, {}
+
+
+# 每个服务商支持的编号密钥数量（{name}_1 ~ {name}_5）
+_MAX_ENV_KEYS = 5
+
+# 并发批量分页时放宽连接数上限；空闲连接保持75秒（httpx默认5秒，两次分页调用之间的间隔常常更长）
+_HTTP_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=75.0)
+
+# 所有OpenAI客户端共享的HTTP连接池（安装h2时启用HTTP/2多路复用）
+_SHARED_HTTP_CLIENT = DefaultHttpxClient(http2=HTTP2_AVAILABLE, limits=_HTTP_LIMITS)
+
+# Liai等直接使用requests的接口按服务地址共享Session
+_SHARED_SESSIONS: Dict[str, requests.Session] = {}
+_SHARED_SESSIONS_LOCK = threading.Lock()
+
+# 异步客户端按事件循环登记：异步连接池绑定在创建它的事件循环上，不能跨循环共享。
+# 客户端经连接池反向引用着事件循环，弱引用键永远不会失效，因此由_async_client_scope在最外层调用结束时关闭并移除
+_ASYNC_CLIENTS: Dict[asyncio.AbstractEventLoop, "_LoopClients"] = {}
+_ASYNC_CLIENTS_LOCK = threading.Lock()
+
+
+# SSE读取块大小：分块传输下iter_content在每个chunk到达时即返回，块大小只决定单次读取上限，
+# 64 KiB可以减少长回复时Python层的循环次数和bytearray拼接次数，而不会推迟增量的到达
+_SSE_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_sse_data(response: requests.Response, chunk_size: int = _SSE_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    按字节解析SSE流，逐条产出"data: "行的内容（不解码为字符串，可直接交给orjson）
+
+    从iter_content读取的数据累积在同一个bytearray中，按换行切出完整行后原地删除已处理部分；
+    注释行（如阿里云的": keep-alive"）和空行直接跳过
+    """
+    buf = bytearray()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        buf += chunk
+        start = 0
+        while True:
+            end = buf.find(b'\n', start)
+            if end < 0:
+                break
+            line = bytes(buf[start:end]).strip()
+            start = end + 1
+            if line.startswith(b'data: '):
+                yield line[6:]
+        del buf[:start]
+    
+    # 流结束时最后一行可能没有换行
+    line = bytes(buf).strip()
+    if line.startswith(b'data: '):
+        yield line[6:]
+
+
+def _liai_answer(data: Any) -> str:
+    """取出Liai事件或blocking响应中的answer（顶层answer优先，其次data.answer），没有时返回空字符串"""
+    if not isinstance(data, dict):
+        return ""
+    inner = data.get('data')
+    return data.get('answer') or (inner.get('answer') if isinstance(inner, dict) else None) or ""
+
+
+def _collect_env_keys(name: str, max_keys: int = _MAX_ENV_KEYS) -> List[str]:
+    """
+    从环境变量收集多密钥：优先读取编号密钥{name}_1 ~ {name}_{max_keys}，都没有时使用单个密钥{name}
+    """
+    environ = os.environ
+    keys = [value for value in (environ.get(f'{name}_{i}') for i in range(1, max_keys + 1)) if value]
+    if not keys and environ.get(name):
+        keys = [environ[name]]
+    return keys
+
+
+@functools.lru_cache(maxsize=16)
+def _get_openai_client(api_key: str, base_url: str, timeout: float) -> OpenAI:
+    """按(api_key, base_url, timeout)复用OpenAI客户端，所有客户端共享同一个httpx连接池"""
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, http_client=_SHARED_HTTP_CLIENT)
+
+
+def _get_shared_session(base_url: str) -> requests.Session:
+    """获取base_url对应的共享requests.Session，多个AIPageSplitter实例复用同一个连接池"""
+    with _SHARED_SESSIONS_LOCK:
+        session = _SHARED_SESSIONS.get(base_url)
+        if session is None:
+            session = requests.Session()
+            # 公共请求头只设置一次（每次请求只需附加密钥）；SSE小帧使用identity编码，避免逐块gzip解压
+            session.headers.update({
+                'Connection': 'keep-alive',
+                'Accept-Encoding': 'identity',
+                'Content-Type': 'application/json'
+            })
+            # Retry默认不重试POST，需显式允许；429按密钥限流，交给调用方切换下一个密钥而不是原地退避。
+            # 只按status_forcelist重试：连接/读取超时等错误不重放POST（避免重复计费的生成请求和成倍的超时等待），
+            # 直接交给调用方切换密钥
+            adapter = HTTPAdapter(
+                pool_connections=8,
+                pool_maxsize=50,  # 批量并发和对冲请求时同一服务地址的连接数
+                max_retries=Retry(
+                    total=2,
+                    connect=0,
+                    read=0,
+                    other=0,
+                    backoff_factor=0.2,
+                    status_forcelist=[500, 502, 503, 504],
+                    allowed_methods=["POST"]
+                )
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _SHARED_SESSIONS[base_url] = session
+    return session
+
+
+class _LoopClients:
+    """一个事件循环内共享的异步客户端；users为当前处在_async_client_scope中的调用数"""
+
+    def __init__(self):
+        self.users = 0
+        self.openai: Dict[Tuple[str, str, float], AsyncOpenAI] = {}
+        self.liai_session = None  # aiohttp.ClientSession，首次调用Liai接口时创建
+
+    async def aclose(self) -> None:
+        """关闭全部客户端及其连接（必须在所属事件循环中调用）"""
+        closers = [client.close() for client in self.openai.values()]
+        self.openai.clear()
+        if self.liai_session is not None:
+            closers.append(self.liai_session.close())
+            self.liai_session = None
+        await asyncio.gather(*closers, return_exceptions=True)
+
+
+def _loop_clients() -> _LoopClients:
+    """当前事件循环登记的异步客户端，不存在时创建"""
+    loop = asyncio.get_running_loop()
+    with _ASYNC_CLIENTS_LOCK:
+        clients = _ASYNC_CLIENTS.get(loop)
+        if clients is None:
+            clients = _ASYNC_CLIENTS[loop] = _LoopClients()
+    return clients
+
+
+@contextlib.asynccontextmanager
+async def _async_client_scope() -> AsyncIterator[None]:
+    """
+    异步客户端的使用范围，可嵌套：同一事件循环中处在范围内的调用共享客户端和连接，
+    最后一个范围退出时在本循环中关闭它们，避免每次asyncio.run都遗留事件循环、客户端和连接
+    """
+    loop = asyncio.get_running_loop()
+    clients = _loop_clients()
+    with _ASYNC_CLIENTS_LOCK:
+        clients.users += 1
+    try:
+        yield
+    finally:
+        with _ASYNC_CLIENTS_LOCK:
+            clients.users -= 1
+            # 登记项可能已被close_all换掉；没有调用方持有的登记项（包括换掉后新建的）在这里一并关闭
+            current = _ASYNC_CLIENTS.get(loop)
+            if current is not None and current.users == 0:
+                del _ASYNC_CLIENTS[loop]
+            else:
+                current = None
+        if current is not None:
+            await current.aclose()
+
+
+def _get_async_openai_client(api_key: str, base_url: str, timeout: float) -> AsyncOpenAI:
+    """获取当前事件循环中(api_key, base_url, timeout)对应的AsyncOpenAI客户端（需在_async_client_scope内调用）"""
+    clients = _loop_clients().openai
+    client_key = (api_key, base_url, timeout)
+    client = clients.get(client_key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key, base_url=base_url, timeout=timeout,
+            http_client=DefaultAsyncHttpxClient(http2=HTTP2_AVAILABLE, limits=_HTTP_LIMITS)
+        )
+        clients[client_key] = client
+    return client
+
+
+def _get_async_liai_session() -> "aiohttp.ClientSession":
+    """获取当前事件循环共享的Liai aiohttp会话（需在_async_client_scope内调用），连接在多次调用间复用"""
+    clients = _loop_clients()
+    if clients.liai_session is None or clients.liai_session.closed:
+        clients.liai_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=75),
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=120),
+            headers={'Accept-Encoding': 'identity', 'Content-Type': 'application/json'}
+        )
+    return clients.liai_session
+
+
+def _close_loop_clients(loop: asyncio.AbstractEventLoop, clients: _LoopClients) -> None:
+    """在所属事件循环中关闭异步客户端：循环运行中时提交给该循环执行，未运行时直接运行到完成"""
+    if loop.is_closed():
+        return
+    try:
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(clients.aclose(), loop)
+        else:
+            loop.run_until_complete(clients.aclose())
+    except RuntimeError as e:
+        print(f"⚠️ 关闭异步客户端失败: {e}")
+
+
+def _close_shared_clients() -> None:
+    """
+    关闭所有共享连接池（进程退出或需要丢弃现有连接时调用）
+
+    同步的httpx连接池关闭后立即换成新的，之后创建的OpenAI客户端仍可正常使用；
+    异步客户端的连接池只能在其事件循环中关闭，交给各自的事件循环执行
+    """
+    global _SHARED_HTTP_CLIENT
+    _get_openai_client.cache_clear()
+    old_client, _SHARED_HTTP_CLIENT = _SHARED_HTTP_CLIENT, DefaultHttpxClient(http2=HTTP2_AVAILABLE, limits=_HTTP_LIMITS)
+    old_client.close()
+    
+    with _SHARED_SESSIONS_LOCK:
+        sessions = list(_SHARED_SESSIONS.values())
+        _SHARED_SESSIONS.clear()
+    for session in sessions:
+        session.close()
+    
+    with _ASYNC_CLIENTS_LOCK:
+        loop_clients = list(_ASYNC_CLIENTS.items())
+        _ASYNC_CLIENTS.clear()
+    for loop, clients in loop_clients:
+        _close_loop_clients(loop, clients)
+
+
+def _extract_json_str(content: str) -> str:
+    """
+    从AI回复中提取JSON文本（支持```json代码块和裸JSON）
+
+    单次线性扫描：定位第一个{或[后按括号深度匹配到对应的闭合位置，
+    跳过字符串字面量中的括号，避免正则回溯
+    """
+    fence = content.find('```')
+    search_from = fence + 3 if fence >= 0 else 0
+
+    brace = content.find('{', search_from)
+    bracket = content.find('[', search_from)
+    candidates = [pos for pos in (brace, bracket) if pos >= 0]
+    if not candidates:
+        # 没有JSON起始符，交由后续解析报错
+        return content.strip()
+    start = min(candidates)
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(content)):
+        char = content[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return content[start:i + 1]
+
+    # 括号未闭合（通常是回复被截断），返回剩余内容交由截断检查处理
+    return content[start:].strip()
+
+
+class _PageStreamParser:
+    """
+    流式回复的增量JSON扫描器
+
+    随AI流式输出逐段喂入文本，跟踪括号深度和字符串状态：
+    - 每当数组中的一个{...}对象闭合且包含page_number时立即解析出该页，不必等待整个回复结束
+    - 顶层JSON闭合时记录其文本，流式结束时即已完成提取，无需再扫描一遍完整回复
+
+    收到的片段原样保存在列表中，位置均为全局偏移，只在取出页面/JSON文本时拼接涉及的片段，
+    避免长回复逐段累加字符串的二次方开销
+    """
+
+    def __init__(self, parse_pages: bool = True):
+        self._parse_pages = parse_pages
+        self._emitted_numbers = set()
+        self.reset()
+
+    def reset(self) -> None:
+        """清空扫描状态以接收一次新的回复，已产出的页码保留，重试时不重复产出"""
+        self._chunks: List[str] = []
+        self._chunk_starts: List[int] = []  # 各片段在完整回复中的起始位置
+        self._length = 0
+        self._started = False
+        self._done = False
+        self._json_start = -1
+        self.json_str: Optional[str] = None
+        self._in_string = False
+        self._escape = False
+        # 未闭合的容器栈：(括号字符, 起始位置)
+        self._stack: List[Tuple[str, int]] = []
+
+    @property
+    def truncated(self) -> bool:
+        """已开始扫描JSON但顶层始终没有闭合（回复被截断）"""
+        return self._started and not self._done
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """喂入一段新文本，返回本次新解析出的完整页面"""
+        pages = []
+        if not chunk:
+            return pages
+        base = self._length
+        self._chunks.append(chunk)
+        self._chunk_starts.append(base)
+        self._length += len(chunk)
+        if self._done:
+            return pages
+
+        stack = self._stack
+        i = 0
+        if not self._started:
+            # 跳过```json等前导内容，从第一个括号开始扫描（之前的片段中没有括号，只需查找本片段）
+            starts = [pos for pos in (chunk.find('{'), chunk.find('[')) if pos >= 0]
+            if not starts:
+                return pages
+            i = min(starts)
+            self._started = True
+            self._json_start = base + i
+
+        for i in range(i, len(chunk)):
+            char = chunk[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                stack.append((char, base + i))
+            elif char in '}]':
+                if not stack:
+                    continue
+                opener, start = stack.pop()
+                if not stack:
+                    # 顶层JSON闭合，之后的内容（结尾```等）不再扫描
+                    self.json_str = self._slice(start, base + i + 1)
+                    self._done = True
+                    break
+                # 只有数组元素级别的对象才可能是页面（跳过analysis等嵌套对象）
+                if self._parse_pages and opener == '{' and stack[-1][0] == '[':
+                    page = self._try_parse_page(self._slice(start, base + i + 1))
+                    if page is not None:
+                        pages.append(page)
+        return pages
+
+    def _slice(self, start: int, end: int) -> str:
+        """取完整回复中[start, end)的文本，只拼接涉及的片段"""
+        starts = self._chunk_starts
+        first = bisect.bisect_right(starts, start) - 1
+        last = bisect.bisect_right(starts, end - 1) - 1
+        if first == last:
+            return self._chunks[first][start - starts[first]:end - starts[first]]
+        parts = [self._chunks[first][start - starts[first]:]]
+        parts.extend(self._chunks[first + 1:last])
+        parts.append(self._chunks[last][:end - starts[last]])
+        return "".join(parts)
+
+    def extract_json_str(self, content: str) -> Optional[str]:
+        """
+        返回流式扫描得到的完整JSON文本，结果与_extract_json_str(content)一致
+
+        以下情况返回None，由调用方回退到_extract_json_str：
+        JSON未闭合（被截断）、扫描内容与最终回复不一致（密钥故障转移后重新输出）、
+        扫描起点位于```代码块之前（起点可能是说明文字中的括号）
+        """
+        if self.json_str is None:
+            return None
+        text = "".join(self._chunks)
+        if text.strip() != content:
+            return None
+        fence = text.find('```')
+        if fence >= 0 and fence > self._json_start:
+            return None
+        return self.json_str
+
+    def _try_parse_page(self, object_str: str) -> Optional[Dict[str, Any]]:
+        """尝试把闭合的对象解析为页面，非页面或重复页码返回None"""
+        try:
+            obj = _json_loads(object_str)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict) or 'page_number' not in obj:
+            return None
+        # 密钥故障转移时回复会重新开始，按页码去重
+        page_number = obj['page_number']
+        if page_number in self._emitted_numbers:
+            return None
+        self._emitted_numbers.add(page_number)
+        return obj
+
+
+class _LRUCache(OrderedDict):
+    """
+    带容量上限、总字节上限和过期时间的LRU缓存（线程安全）
+
+    条目数超出maxsize或估算总字节数超出max_bytes时淘汰最久未使用的条目；
+    值按(过期时间, 值, 字节数)存储，get_fresh读取时跳过并删除已过期的条目，命中情况累计在stats中
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, value) -> None:
+        old = self.get(key)
+        if old is not None:
+            self.total_bytes -= old[2]
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        self.total_bytes += value[2]
+        while len(self) > self.maxsize or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            _, evicted = self.popitem(last=False)
+            self.total_bytes -= evicted[2]
+
+    def put(self, key, value, size: int = 0, now: Optional[float] = None) -> None:
+        """写入一个条目（size为估算的字节数），按ttl计算过期时间；单个条目超过max_bytes时不缓存"""
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        now = time.time() if now is None else now
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self[key] = (expires_at, value, size)
+
+    def get_fresh(self, key, now: Optional[float] = None) -> Any:
+        """读取未过期的值，未命中或已过期返回None"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < now:
+                del self[key]
+                self.total_bytes -= entry[2]
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+
+# 分页结果缓存（模块级）：页面每次请求都会新建AIPageSplitter，实例级缓存无法跨请求命中
+_SPLIT_RESULT_CACHE = _LRUCache(_CACHE_MAX_ENTRIES, _CACHE_TTL_SECONDS, _CACHE_MAX_BYTES)
+
 
 class AIPageSplitter:
     """AI智能分页处理器"""
     
     def __init__(self, api_key: Optional[str] = None):
         """初始化AI分页处理器"""
-        config = get_config()
+        self.config = get_config()
         
-        # 根据当前选择的模型获取对应的配置
-        model_info = config.get_model_info()
+        # 密钥轮询迭代器（批量并发时多个线程共享，需加锁）
+        self._key_lock = threading.Lock()
         
-        # 初始化多密钥管理
-        self._initialize_api_keys(model_info, config, api_key)
+        # 根据当前选择的模型初始化密钥、服务地址和接口格式
+        self.refresh_model_info(api_key)
+        
+        # 分页结果缓存：按(模型, 目标页数, 文本哈希)缓存，所有实例共享
+        self._cache = _SPLIT_RESULT_CACHE
+        self.cache_stats = self._cache.stats
+        
+    def refresh_model_info(self, api_key: Optional[str] = None) -> None:
+        """
+        读取当前选择的模型配置并保存在实例上，调用路径直接使用self.model_info
+
+        运行中切换了config.ai_model时调用，重新初始化密钥、服务地址、接口格式和共享Session
+        """
+        model_info = self.config.get_model_info()
+        self.model_info = model_info
         
-        self.base_url = model_info.get('base_url', config.openai_base_url)
-        self.config = config
+        # 初始化多密钥管理
+        self._initialize_api_keys(model_info, self.config, api_key)
+        with self._key_lock:
+            self._key_cycle = itertools.cycle(self.api_keys)
         
-        # 创建持久化session用于HTTP连接复用
-        self.session = requests.Session()
+        self.base_url = model_info.get('base_url', self.config.openai_base_url)
         
-        # 简单的内存缓存
-        self._cache = {}
+        # 接口格式在切换模型前不变，这里判断一次，调用时直接按标志分派
+        self._is_liai = model_info.get('request_format') == 'dify_compatible'
+        self._is_streaming_compatible = model_info.get('request_format') == 'streaming_compatible'
         
-        # 密钥轮询索引
-        self._current_key_index = 0
+        # 支持JSON模式的模型直接要求返回JSON对象，省去代码块包裹和提取
+        self._completion_kwargs = {'response_format': {'type': 'json_object'}} if model_info.get('json_mode') else {}
         
+        # 持久化session用于HTTP连接复用（同一服务地址的所有实例共享）
+        self.session = _get_shared_session(self.base_url)
     
+    @classmethod
+    def close_all(cls) -> None:
+        """关闭所有实例共享的OpenAI客户端和requests.Session连接池（服务关闭时调用）"""
+        _close_shared_clients()
+        print("🔌 已关闭AI分页共享连接池")
+
     def _initialize_api_keys(self, model_info, config, api_key):
         """初始化API密钥列表"""
-        import os
-        
         if api_key:
             self.api_keys = [api_key]
             return
         
         if model_info.get('api_provider') == 'Volces' and model_info.get('use_multiple_keys'):
             # 从环境变量获取火山引擎密钥（多密钥负载均衡）
-            self.api_keys = []
-            for i in range(1, 6):  # 支持1-5个密钥
-                key_name = f'ARK_API_KEY_{i}'
-                key_value = os.getenv(key_name)
-                if key_value:
-                    self.api_keys.append(key_value)
-            
-            # 如果没有找到编号密钥，尝试单个密钥
-            if not self.api_keys:
-                single_key = os.getenv('ARK_API_KEY')
-                if single_key:
-                    self.api_keys = [single_key]
+            self.api_keys = _collect_env_keys('ARK_API_KEY')
         elif model_info.get('api_provider') == 'Liai':
             # Liai API多密钥负载均衡
-            self.api_keys = []
-            for i in range(1, 6):  # 支持1-5个密钥
-                key_name = f'LIAI_API_KEY_{i}'
-                key_value = os.getenv(key_name)
-                if key_value:
-                    self.api_keys.append(key_value)
-            
-            # 如果没有找到编号密钥，尝试单个密钥
-            if not self.api_keys:
-                single_key = os.getenv('LIAI_API_KEY')
-                if single_key:
-                    self.api_keys = [single_key]
+            self.api_keys = _collect_env_keys('LIAI_API_KEY')
         else:
             # 其他API使用单密钥
             api_key_env = model_info.get('api_key_env')
@@ -97,11 +780,19 @@ class AIPageSplitter:
         if not self.api_keys:
             raise ValueError("没有可用的API密钥")
         
-        key = self.api_keys[self._current_key_index]
-        self._current_key_index = (self._current_key_index + 1) % len(self.api_keys)
-        return key
+        with self._key_lock:
+            return next(self._key_cycle)
+    
+    def _key_rotation(self) -> List[str]:
+        """
+        本次调用的密钥尝试顺序：从轮询到的下一个密钥开始，每个密钥恰好一次
+
+        起点只取一次再按列表顺序排开，并发调用交错轮询时也不会重复尝试同一个密钥而漏掉其他密钥
+        """
+        start = self.api_keys.index(self._get_next_api_key())
+        return self.api_keys[start:] + self.api_keys[:start]
     
-    def split_text_to_pages(self, user_text: str, target_pages: Optional[int] = None) -> Dict[str, Any]:
+    def split_text_to_pages(self, user_text: str, target_pages: Optional[int] = None) -> SplitResultDict:
         """
         将用户文本智能分割为多个PPT页面（使用两次调用策略）
 
@@ -110,21 +801,224 @@ class AIPageSplitter:
             target_pages: 目标页面数量（可选，由AI自动判断）
 
         Returns:
-            Dict: 分页结果，包含每页的内容和分析
+            SplitResultDict: 分页结果，包含每页的内容和分析
         """
-        log_user_action("AI智能分页", f"文本长度: {len(user_text)}, 两次调用策略, AI内容整理")
+        enqueue("AI智能分页", f"文本长度: {len(user_text)}, 两次调用策略, AI内容整理")
+
+        # 相同文本、页数和模型的分页结果直接从缓存返回，跳过两次AI调用
+        cache_key, cached = self._lookup_cache(user_text, target_pages)
+        if cached is not None:
+            return cached
 
         try:
             # 使用两次调用策略
-            return self._split_with_two_pass(user_text, target_pages)
+            result = self._split_with_two_pass(user_text, target_pages)
             
         except Exception as e:
             print(f"AI分页分析失败: {e}")
             raise e
+
+        if cache_key is not None:
+            self._cache_put(cache_key, result)
+        return result
+
+    def _lookup_cache(self, user_text: str, target_pages: Optional[int]) -> Tuple[Optional[Tuple], Optional[Dict[str, Any]]]:
+        """查询分页缓存，返回(缓存键, 缓存结果)；含时效性词语的文本不参与缓存，缓存键为None"""
+        if _CACHE_EXCLUDE_RE.search(user_text):
+            return None, None
+        cache_key = self._make_cache_key(user_text, target_pages)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            print(f"⚡ 命中分页缓存，跳过AI调用（累计命中{self.cache_stats['hits']}次，未命中{self.cache_stats['misses']}次）")
+        return cache_key, cached
+
+    def _lookup_first_pass_cache(self, user_text: str) -> Tuple[Optional[Tuple], Optional[Dict[str, Any]]]:
+        """
+        查询第一次调用（逻辑结构分析）的缓存，返回(缓存键, 缓存结果)
+
+        第一次调用不依赖目标页数，同一文本换一个页数重新分页时只需重做第二次调用
+        """
+        if _CACHE_EXCLUDE_RE.search(user_text):
+            return None, None
+        cache_key = self._make_cache_key(user_text, _FIRST_PASS_CACHE_TAG)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            print("⚡ 命中第一次调用缓存，跳过逻辑结构分析")
+        return cache_key, cached
+
+    def _make_cache_key(self, user_text: str,
+                        target_pages: Union[int, str, None]) -> Tuple[str, Union[int, str, None], str]:
+        """生成分页缓存键：(模型, 目标页数, 文本哈希)，第一次调用的缓存以_FIRST_PASS_CACHE_TAG代替目标页数"""
+        if self.config.ai_cache_ignore_whitespace:
+            user_text = _normalize_cache_text(user_text)
+        text_hash = hashlib.blake2b(user_text.encode('utf-8'), digest_size=16).hexdigest()
+        return (self.config.ai_model, target_pages, text_hash)
+
+    def _cache_get(self, cache_key: Tuple) -> Optional[Dict[str, Any]]:
+        """读取缓存的分页结果（返回副本），未命中或已过期返回None"""
+        result = self._cache.get_fresh(cache_key)
+        return copy.deepcopy(result) if result is not None else None
+
+    def _cache_put(self, cache_key: Tuple, result: Dict[str, Any]) -> None:
+        """写入分页结果副本，超出容量时淘汰最久未使用的条目；备用分页结果不缓存"""
+        if result.get('is_fallback'):
+            return
+        # 缓存副本，避免调用方修改返回结果后污染缓存；以JSON编码长度估算占用的内存
+        self._cache.put(cache_key, copy.deepcopy(result), len(_json_dumps(result)))
     
-    def _call_liai_api(self, system_prompt: str, user_text: str) -> str:
-        """调用Liai API（支持多密钥负载均衡）"""
-        model_info = self.config.get_model_info()
+    async def split_text_to_pages_async(self, user_text: str, target_pages: Optional[int] = None) -> SplitResultDict:
+        """
+        异步版本的智能分页：OpenAI兼容接口使用AsyncOpenAI原生协程，其余接口在线程池中执行，不占用事件循环
+
+        Args:
+            user_text: 用户输入的原始文本
+            target_pages: 目标页面数量（可选，由AI自动判断）
+
+        Returns:
+            SplitResultDict: 分页结果，与split_text_to_pages一致
+        """
+        enqueue("AI智能分页(异步)", f"文本长度: {len(user_text)}, 两次调用策略, AI内容整理")
+
+        cache_key, cached = self._lookup_cache(user_text, target_pages)
+        if cached is not None:
+            return cached
+
+        # 两次调用共享本事件循环的客户端连接，结束后统一关闭
+        async with _async_client_scope():
+            try:
+                # 第一次调用：注重逻辑结构，不强制页数
+                print(f"🔄 开始两次调用AI分页策略（异步），目标页数: {target_pages}")
+                first_key, first_result = self._lookup_first_pass_cache(user_text)
+                if first_result is None:
+                    first_content = await self._acall_api_with_prompt(self._build_logical_structure_prompt_enhanced(), user_text)
+                    first_result = self._parse_ai_response_without_ending(first_content, user_text)
+                    if first_key is not None:
+                        self._cache_put(first_key, first_result)
+                print(f"✅ 第一次调用完成，生成 {first_result['analysis']['total_pages']} 页")
+
+                # 第二次调用：基于第一次结果，调整页数
+                second_system_prompt, first_result_text = self._prepare_second_pass(first_result, target_pages)
+                second_content = await self._acall_api_with_prompt(second_system_prompt, first_result_text)
+                result = self._finish_two_pass(first_result, self._parse_ai_response(second_content, user_text))
+
+            except Exception as e:
+                print(f"AI分页分析失败: {e}")
+                raise e
+
+        if cache_key is not None:
+            self._cache_put(cache_key, result)
+        return result
+
+    def split_text_to_pages_streaming(self, user_text: str,
+                                      target_pages: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式版本的智能分页，第二次调用的回复边生成边解析，每完成一页立即产出
+
+        Args:
+            user_text: 用户输入的原始文本
+            target_pages: 目标页面数量（可选，由AI自动判断）
+
+        Yields:
+            Dict: {'type': 'page', 'page': 页面} 为提前解析出的页面（仅供预览），
+                  最后一个事件为 {'type': 'result', 'result': 分页结果}，
+                  与split_text_to_pages返回值一致（含目录页、结尾页和校验）
+        """
+        enqueue("AI智能分页(流式)", f"文本长度: {len(user_text)}, 两次调用策略")
+
+        # 命中缓存时没有需要预览的增量，直接产出最终结果
+        cache_key, cached = self._lookup_cache(user_text, target_pages)
+        if cached is not None:
+            yield {'type': 'result', 'result': cached}
+            return
+
+        events = queue.Queue()
+        streamed_pages = []
+
+        def _on_page(page: Dict[str, Any]) -> None:
+            # 只校验新增的这一页；格式不完整的页面不提前产出（最终结果仍会整体校验）
+            streamed_pages.append(page)
+            if not self._validate_pages(streamed_pages, len(streamed_pages) - 1)['is_valid']:
+                streamed_pages.pop()
+                return
+            events.put({'type': 'page', 'page': page})
+
+        def _worker() -> None:
+            try:
+                result = self._split_with_two_pass(user_text, target_pages, on_page=_on_page)
+                if cache_key is not None:
+                    self._cache_put(cache_key, result)
+                events.put({'type': 'result', 'result': result})
+            except Exception as e:
+                events.put({'type': 'error', 'error': e})
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+        while True:
+            event = events.get()
+            if event['type'] == 'error':
+                print(f"AI分页分析失败: {event['error']}")
+                raise event['error']
+            yield event
+            if event['type'] == 'result':
+                return
+
+    async def split_texts_batch(self, texts: List[str], target_pages: Optional[int] = None,
+                                max_concurrent: int = 5, max_retries: int = 2,
+                                use_batch_api: bool = False) -> List[Dict[str, Any]]:
+        """
+        并发处理多个文档的智能分页
+
+        Args:
+            texts: 待分页的文本列表
+            target_pages: 目标页面数量（可选，对所有文档生效）
+            max_concurrent: 最大并发请求数
+            max_retries: 遇到限流时的最大重试次数（指数退避）
+            use_batch_api: 是否改用OpenAI Batch API离线处理（仅标准OpenAI接口，适合非交互的批量任务）
+
+        Returns:
+            List[Dict]: 与texts顺序一致的分页结果，单个文档失败时为 {'success': False, 'error': ...}
+        """
+        if use_batch_api:
+            return await asyncio.to_thread(self.split_texts_via_batch_api, texts, target_pages)
+
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def _split_one(index: int, text: str) -> Dict[str, Any]:
+            async with semaphore:
+                for attempt in range(max_retries + 1):
+                    try:
+                        return await self.split_text_to_pages_async(text, target_pages)
+                    except Exception as e:
+                        if attempt < max_retries and self._is_rate_limit_error(e):
+                            delay = 2 ** attempt
+                            print(f"⏳ 第{index + 1}个文档触发限流，{delay}秒后重试...")
+                            await asyncio.sleep(delay)
+                            continue
+                        print(f"❌ 第{index + 1}个文档分页失败: {e}")
+                        return {'success': False, 'error': str(e)}
+
+        enqueue("AI批量分页", f"文档数量: {len(texts)}, 最大并发: {max_concurrent}")
+        # 所有文档共享本事件循环的客户端连接，全部完成后统一关闭
+        async with _async_client_scope():
+            return await asyncio.gather(*(_split_one(i, text) for i, text in enumerate(texts)))
+
+    @staticmethod
+    def _is_rate_limit_error(error: Exception) -> bool:
+        """判断异常是否由API限流（429）引起"""
+        if isinstance(error, RateLimitError):
+            return True
+        # aiohttp的ClientResponseError直接在status上携带状态码
+        if getattr(error, 'status', None) == 429:
+            return True
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None) == 429
+
+    def _call_liai_api(self, system_prompt: str, user_text: str,
+                       on_delta: Optional[Callable[[str], None]] = None,
+                       stream: bool = True,
+                       on_attempt: Optional[Callable[[], None]] = None) -> str:
+        """调用Liai API（支持多密钥负载均衡），on_delta在收到每段流式内容时回调；stream=False时使用blocking模式"""
+        model_info = self.model_info
         base_url = model_info.get('base_url', '')
         endpoint = model_info.get('chat_endpoint', '/chat-messages')
         
@@ -136,154 +1030,257 @@ class AIPageSplitter:
         payload = {
             "inputs": {},
             "query": combined_query,
-            "response_mode": "streaming",  # 改为streaming模式提升响应速度
+            "response_mode": "streaming" if stream else "blocking",  # 默认streaming模式提升响应速度
             "conversation_id": "",
             "user": "ai-ppt-user",
             "files": []
         }
+        # 请求体只编码一次，切换密钥重试时直接复用
+        compress = model_info.get('gzip_request', False)
+        body, body_headers = _encode_json_body(payload, compress)
         
-        # 尝试所有可用密钥
-        last_exception = None
-        for attempt in range(len(self.api_keys)):
-            current_api_key = self._get_next_api_key()
+        def _call_once(current_api_key: str) -> str:
+            headers = {'Authorization': f'Bearer {current_api_key}', **body_headers}
             
-            headers = {
-                'Authorization': f'Bearer {current_api_key}',
-                'Content-Type': 'application/json',
-                'Connection': 'keep-alive'  # 保持连接
-            }
+            # 使用持久化会话复用连接，增加超时处理
+            response = self.session.post(url, headers=headers, data=body, timeout=120, stream=stream)
+            response.raise_for_status()
             
-            try:
-                print(f"尝试使用Liai API密钥 {attempt + 1}/{len(self.api_keys)} (末尾: ...{current_api_key[-8:]})")
-                
-                # 使用持久化会话复用连接，增加超时处理
-                response = self.session.post(url, headers=headers, json=payload, timeout=120, stream=True)
-                response.raise_for_status()
-                
-                # 处理streaming响应，特别处理阿里云API的keep-alive
-                content = ""
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            line_text = line.decode('utf-8').strip()
-                            # 忽略阿里云的keep-alive注释
-                            if line_text == ': keep-alive' or line_text == '':
-                                continue
-                            if line_text.startswith('data: '):
-                                json_str = line_text[6:]  # 去掉'data: '前缀
-                                if json_str.strip() == '[DONE]':
-                                    break
-                                data = json.loads(json_str)
-                                if 'answer' in data:
-                                    content += data['answer']
-                                elif 'data' in data and 'answer' in data['data']:
-                                    content += data['data']['answer']
-                        except (json.JSONDecodeError, UnicodeDecodeError):
-                            continue
+            content = ""
+            if stream:
+                # 处理streaming响应（阿里云的keep-alive注释行在分帧时已跳过），片段收集后一次拼接
+                parts = []
+                for json_bytes in _iter_sse_data(response):
+                    if json_bytes == b'[DONE]':
+                        break
+                    try:
+                        delta = _liai_answer(_json_loads(json_bytes))
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    if delta:
+                        parts.append(delta)
+                        if on_delta:
+                            on_delta(delta)
+                content = "".join(parts)
                 
-                # 如果streaming失败，尝试作为普通JSON处理
+                # 流式响应体已被读完，无法再按普通JSON解析；没拿到内容时用blocking模式重新请求一次
                 if not content:
-                    try:
-                        result = response.json()
-                        content = result.get('answer', '') or result.get('data', {}).get('answer', '')
-                    except:
-                        pass
+                    print("⚠️ Liai流式响应为空，改用blocking模式重试一次")
+                    blocking_body, _ = _encode_json_body(dict(payload, response_mode="blocking"), compress)
+                    response = self.session.post(url, headers=headers, data=blocking_body, timeout=120)
+                    response.raise_for_status()
+                    content = self._extract_liai_answer(response.content)
+                    if on_delta and content:
+                        on_delta(content)
+            else:
+                # blocking模式：响应体即完整JSON
+                content = self._extract_liai_answer(response.content)
+            
+            # 成功获取内容，返回结果
+            if content.strip():
+                print(f"✅ Liai API密钥 ...{current_api_key[-8:]} 调用成功")
+                return content.strip()
+            raise Exception("API返回空内容")
+        
+        # 尝试所有可用密钥
+        return self._with_key_failover(_call_once, "Liai API", on_attempt)
+    
+    def _with_key_failover(self, call_once: Callable[[str], str], label: str = "API",
+                           on_attempt: Optional[Callable[[], None]] = None) -> str:
+        """
+        按轮询顺序逐个密钥调用call_once(api_key)，失败时切换下一个密钥
+
+        所有密钥都失败时抛出最后一个异常；label用于日志中的接口名称，
+        on_attempt在每个密钥调用前回调
+        """
+        last_exception = None
+        for attempt, current_api_key in enumerate(self._key_rotation()):
+            try:
+                print(f"尝试使用{label}密钥 {attempt + 1}/{len(self.api_keys)} (末尾: ...{current_api_key[-8:]})")
+                if on_attempt:
+                    on_attempt()
+                return call_once(current_api_key)
                 
-                # 成功获取内容，返回结果
-                if content.strip():
-                    print(f"✅ Liai API密钥 ...{current_api_key[-8:]} 调用成功")
-                    return content.strip()
-                else:
-                    raise Exception("API返回空内容")
-                    
             except Exception as e:
                 last_exception = e
-                print(f"❌ Liai API密钥 ...{current_api_key[-8:]} 调用失败: {e}")
+                print(f"❌ {label}密钥 ...{current_api_key[-8:]} 调用失败: {e}")
                 
                 # 如果还有其他密钥可以尝试，继续下一个
                 if attempt < len(self.api_keys) - 1:
-                    print(f"⏳ 尝试下一个Liai API密钥...")
-                    continue
+                    print(f"⏳ 尝试下一个{label}密钥...")
         
         # 所有密钥都失败了
-        print(f"❌ 所有{len(self.api_keys)}个Liai API密钥都失败了")
-        raise last_exception or Exception("所有Liai API密钥调用失败")
+        print(f"❌ 所有{len(self.api_keys)}个{label}密钥都失败了")
+        raise last_exception or Exception(f"所有{label}密钥调用失败")
     
-    def _call_deepseek_api(self, system_prompt: str, user_text: str) -> str:
-        """调用DeepSeek API（带故障转移的多密钥负载均衡）"""
-        model_info = self.config.get_model_info()
-        
-        # 获取实际模型名称和额外头部
-        actual_model = model_info.get('actual_model', 'deepseek-v3-250324')
-        extra_headers = model_info.get('extra_headers', {})
-        
-        # 尝试所有可用密钥
+    async def _awith_key_failover(self, call_once: Callable[[str], Awaitable[str]], label: str = "API") -> str:
+        """_with_key_failover的异步版本：按轮询顺序逐个密钥await call_once(api_key)，失败时切换下一个密钥"""
         last_exception = None
-        for attempt in range(len(self.api_keys)):
-            current_api_key = self._get_next_api_key()
-            
+        for attempt, current_api_key in enumerate(self._key_rotation()):
             try:
-                # 为当前密钥创建临时客户端
-                temp_client = OpenAI(
-                    api_key=current_api_key,
-                    base_url=self.base_url,
-                    timeout=120
-                )
-                
-                print(f"尝试使用API密钥 {attempt + 1}/{len(self.api_keys)} (末尾: ...{current_api_key[-8:]})")
-                
-                # 使用持久化会话复用连接，类似Liai的处理方式
-                response = temp_client.chat.completions.create(
-                    model=actual_model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_text}
-                    ],
-                    temperature=self.config.ai_temperature,
-                    stream=True,  # 使用流式响应，类似Liai
-                    extra_headers=extra_headers,
-                    extra_body={},  # OpenRouter兼容
-                    timeout=120  # 与Liai相同的超时时间
-                )
-                
-                # 处理streaming响应，类似Liai的逐行处理
-                content = ""
-                for chunk in response:
-                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        chunk_content = chunk.choices[0].delta.content
-                        if chunk_content:
-                            content += chunk_content
-                
-                result_content = content.strip() if content else ""
-                print(f"✅ API调用成功，使用密钥: ...{current_api_key[-8:]}")
-                return result_content
+                print(f"尝试使用{label}密钥 {attempt + 1}/{len(self.api_keys)} (末尾: ...{current_api_key[-8:]})")
+                return await call_once(current_api_key)
                 
             except Exception as e:
                 last_exception = e
-                print(f"❌ API密钥 ...{current_api_key[-8:]} 调用失败: {e}")
+                print(f"❌ {label}密钥 ...{current_api_key[-8:]} 调用失败: {e}")
                 
-                # 如果还有其他密钥可以尝试，继续下一个
                 if attempt < len(self.api_keys) - 1:
-                    print(f"⏳ 尝试下一个API密钥...")
-                    continue
+                    print(f"⏳ 尝试下一个{label}密钥...")
         
-        # 所有密钥都失败了
-        print(f"❌ 所有{len(self.api_keys)}个OpenRouter API密钥都失败了")
-        raise last_exception or Exception("所有OpenRouter API密钥调用失败")
+        print(f"❌ 所有{len(self.api_keys)}个{label}密钥都失败了")
+        raise last_exception or Exception(f"所有{label}密钥调用失败")
+    
+    @staticmethod
+    def _extract_liai_answer(body: bytes) -> str:
+        """从Liai blocking模式的响应体中取出answer，格式不符时返回空字符串"""
+        try:
+            return _liai_answer(_json_loads(body))
+        except json.JSONDecodeError:
+            return ""
+    
+    def _call_deepseek_api(self, system_prompt: str, user_text: str,
+                           on_delta: Optional[Callable[[str], None]] = None,
+                           stream: bool = True,
+                           on_attempt: Optional[Callable[[], None]] = None) -> str:
+        """调用DeepSeek API（带故障转移的多密钥负载均衡），on_delta在收到每段流式内容时回调；stream=False时一次性返回"""
+        model_info = self.model_info
+        
+        # 对冲请求：同时向多个密钥发起请求，取最先成功的结果（默认1，即逐个故障转移）
+        hedge_fanout = min(int(model_info.get('hedge_fanout', 1)), len(self.api_keys))
+        if hedge_fanout > 1:
+            return self._call_deepseek_api_hedged(system_prompt, user_text, hedge_fanout, on_delta, stream)
+        
+        def _call_once(current_api_key: str) -> str:
+            result_content = self._stream_deepseek_completion(
+                current_api_key, system_prompt, user_text, on_delta, stream=stream
+            )
+            print(f"✅ API调用成功，使用密钥: ...{current_api_key[-8:]}")
+            return result_content
+        
+        # 尝试所有可用密钥
+        return self._with_key_failover(_call_once, on_attempt=on_attempt)
+    
+    def _call_deepseek_api_hedged(self, system_prompt: str, user_text: str, hedge_fanout: int,
+                                  on_delta: Optional[Callable[[str], None]] = None,
+                                  stream: bool = True) -> str:
+        """
+        对冲调用DeepSeek API：每轮同时使用hedge_fanout个密钥请求，取最先返回非空内容的结果，
+        其余请求立即取消；整轮失败时换下一批密钥
+
+        多路流式输出会相互交错，因此只在确定胜出结果后把完整内容一次性交给on_delta
+        """
+        keys = self._key_rotation()
+        last_exception = None
+        
+        for wave_start in range(0, len(keys), hedge_fanout):
+            wave = keys[wave_start:wave_start + hedge_fanout]
+            print(f"🔀 对冲请求：同时使用{len(wave)}个API密钥")
+            cancel_event = threading.Event()
+            executor = ThreadPoolExecutor(max_workers=len(wave))
+            futures = {
+                executor.submit(self._stream_deepseek_completion, key, system_prompt, user_text,
+                                None, cancel_event, stream): key
+                for key in wave
+            }
+            try:
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        content = future.result()
+                        if not content:
+                            raise Exception("API返回空内容")
+                    except Exception as e:
+                        last_exception = e
+                        print(f"❌ API密钥 ...{key[-8:]} 调用失败: {e}")
+                        continue
+                    
+                    print(f"✅ API调用成功，使用密钥: ...{key[-8:]}")
+                    if on_delta:
+                        on_delta(content)
+                    return content
+            finally:
+                # 通知其余请求停止读取并关闭连接，不等待它们结束
+                cancel_event.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        print(f"❌ 所有{len(self.api_keys)}个API密钥都失败了")
+        raise last_exception or Exception("所有API密钥调用失败")
+    
+    def _stream_deepseek_completion(self, api_key: str, system_prompt: str, user_text: str,
+                                    on_delta: Optional[Callable[[str], None]] = None,
+                                    cancel_event: Optional[threading.Event] = None,
+                                    stream: bool = True) -> str:
+        """使用指定密钥发起一次DeepSeek请求并收集完整内容；cancel_event被设置时中止读取，stream=False时一次性返回"""
+        model_info = self.model_info
+        
+        # 获取实际模型名称和额外头部
+        actual_model = model_info.get('actual_model', 'deepseek-v3-250324')
+        extra_headers = model_info.get('extra_headers', {})
+        
+        # 获取当前密钥的复用客户端（共享连接池，重试和后续调用无需重新握手）
+        temp_client = _get_openai_client(api_key, self.base_url, 120)
+        
+        # 使用持久化会话复用连接，类似Liai的处理方式
+        response = temp_client.chat.completions.create(
+            model=actual_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_text}
+            ],
+            temperature=self.config.ai_temperature,
+            stream=stream,  # 默认使用流式响应，类似Liai
+            extra_headers=extra_headers,
+            **self._completion_kwargs,
+            extra_body={},  # OpenRouter兼容
+            timeout=120  # 与Liai相同的超时时间
+        )
+        
+        if not stream:
+            content = response.choices[0].message.content if response.choices else ""
+            return content.strip() if content else ""
+        
+        # 处理streaming响应，类似Liai的逐行处理（片段收集后一次拼接）
+        parts = []
+        for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                response.close()
+                raise Exception("对冲请求已被取消")
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                chunk_content = chunk.choices[0].delta.content
+                if chunk_content:
+                    parts.append(chunk_content)
+                    if on_delta:
+                        on_delta(chunk_content)
+        
+        return "".join(parts).strip()
     
-    def _split_with_two_pass(self, user_text: str, target_pages: Optional[int]) -> Dict[str, Any]:
-        """两次调用分页策略：第一次注重逻辑性，第二次注重分页数"""
+    def _split_with_two_pass(self, user_text: str, target_pages: Optional[int],
+                             on_page: Optional[Callable[[Dict[str, Any]], None]] = None) -> SplitResultDict:
+        """两次调用分页策略：第一次注重逻辑性，第二次注重分页数（on_page接收第二次调用中流式解析出的页面）"""
         print(f"🔄 开始两次调用AI分页策略，目标页数: {target_pages}")
 
         # 第一次调用：注重逻辑结构，不强制页数
         print("📝 第一次调用：分析内容逻辑结构...（AI内容整理模式）")
-        first_system_prompt = self._build_logical_structure_prompt_enhanced()
-        first_content = self._call_api_with_prompt(first_system_prompt, user_text)
-        first_result = self._parse_ai_response_without_ending(first_content, user_text)  # 不添加结尾页
+        first_key, first_result = self._lookup_first_pass_cache(user_text)
+        if first_result is None:
+            first_system_prompt = self._build_logical_structure_prompt_enhanced()
+            first_content, first_json = self._call_api_for_json(first_system_prompt, user_text)
+            first_result = self._parse_ai_response_without_ending(first_content, user_text, first_json)  # 不添加结尾页
+            if first_key is not None:
+                self._cache_put(first_key, first_result)
         
         print(f"✅ 第一次调用完成，生成 {first_result['analysis']['total_pages']} 页")
         
         # 第二次调用：基于第一次结果，调整页数
+        second_system_prompt, first_result_text = self._prepare_second_pass(first_result, target_pages)
+        second_content, second_json = self._call_api_for_json(second_system_prompt, first_result_text, on_page)
+        second_result = self._parse_ai_response(second_content, user_text, second_json)
+        
+        return self._finish_two_pass(first_result, second_result)
+    
+    def _prepare_second_pass(self, first_result: Dict[str, Any], target_pages: Optional[int]) -> Tuple[str, str]:
+        """根据第一次调用结果准备第二次调用的(系统提示词, 用户输入)"""
         if target_pages:
             print(f"🎯 第二次调用：调整页数至目标 {target_pages} 页...")
         else:
@@ -291,282 +1288,480 @@ class AIPageSplitter:
         second_system_prompt = self._build_page_adjustment_prompt(target_pages)
         
         # 将第一次的结果作为上下文传给第二次调用
-        first_result_text = self._format_first_result_for_second_call(first_result)
-        second_content = self._call_api_with_prompt(second_system_prompt, first_result_text)
-        second_result = self._parse_ai_response(second_content, user_text)
-        
+        return second_system_prompt, self._format_first_result_for_second_call(first_result)
+    
+    @staticmethod
+    def _finish_two_pass(first_result: SplitResultDict, second_result: SplitResultDict) -> SplitResultDict:
+        """标记为两次调用结果并记录两次的页数"""
         print(f"✅ 第二次调用完成，最终生成 {second_result['analysis']['total_pages']} 页")
         
-        # 标记为两次调用结果
         second_result['is_two_pass_result'] = True
         second_result['first_pass_pages'] = first_result['analysis']['total_pages'] + 1  # 第一次页数 + 结尾页
         second_result['final_pass_pages'] = second_result['analysis']['total_pages']  # 第二次页数已包含结尾页
         
         return second_result
     
-    def _call_api_with_prompt(self, system_prompt: str, user_text: str) -> str:
-        """根据配置调用相应的API"""
-        model_info = self.config.get_model_info()
-        if model_info.get('request_format') == 'dify_compatible':
+    async def _acall_api_with_prompt(self, system_prompt: str, user_text: str) -> str:
+        """
+        异步调用API：OpenAI兼容接口（火山引擎DeepSeek和标准格式）使用AsyncOpenAI并按密钥故障转移，
+        Liai接口使用aiohttp；对冲请求（以及未安装aiohttp时的Liai接口）仍在线程池中执行同步实现
+        """
+        model_info = self.model_info
+        stream = self.config.ai_stream_responses
+        if self._is_liai and AIOHTTP_AVAILABLE:
+            return await self._acall_liai_api(system_prompt, user_text)
+        if self._is_liai or int(model_info.get('hedge_fanout', 1)) > 1:
+            return await asyncio.to_thread(self._call_api_with_prompt, system_prompt, user_text, None, stream)
+        
+        if self._is_streaming_compatible:
+            actual_model = model_info.get('actual_model', 'deepseek-v3-250324')
+            extra_headers = model_info.get('extra_headers', {})
+            request_timeout = 120
+        else:
+            actual_model = model_info.get('actual_model', self.config.ai_model)
+            extra_headers = {}
+            request_timeout = 60
+        
+        async def _call_once(current_api_key: str) -> str:
+            client = _get_async_openai_client(current_api_key, self.base_url, request_timeout)
+            response = await client.chat.completions.create(
+                model=actual_model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_text}
+                ],
+                temperature=self.config.ai_temperature,
+                stream=stream,
+                extra_headers=extra_headers,
+                timeout=request_timeout,
+                **self._completion_kwargs
+            )
+            
+            if stream:
+                parts = []
+                async for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                content = "".join(parts)
+            else:
+                content = response.choices[0].message.content if response.choices else ""
+            
+            print(f"✅ API调用成功（异步），使用密钥: ...{current_api_key[-8:]}")
+            return content.strip() if content else ""
+        
+        # 单独调用时也在范围内使用客户端，调用结束即关闭；在外层范围内则复用外层的连接
+        async with _async_client_scope():
+            return await self._awith_key_failover(_call_once)
+    
+    async def _acall_liai_api(self, system_prompt: str, user_text: str) -> str:
+        """异步调用Liai API（aiohttp，支持多密钥故障转移）"""
+        model_info = self.model_info
+        url = model_info.get('base_url', '') + model_info.get('chat_endpoint', '/chat-messages')
+        stream = self.config.ai_stream_responses
+        
+        payload = {
+            "inputs": {},
+            "query": f"{system_prompt}\n\n用户输入：{user_text}",
+            "response_mode": "streaming" if stream else "blocking",
+            "conversation_id": "",
+            "user": "ai-ppt-user",
+            "files": []
+        }
+        compress = model_info.get('gzip_request', False)
+        body, body_headers = _encode_json_body(payload, compress)
+        
+        async def _call_once(current_api_key: str) -> str:
+            headers = {'Authorization': f'Bearer {current_api_key}', **body_headers}
+            session = _get_async_liai_session()
+            async with session.post(url, data=body, headers=headers) as response:
+                response.raise_for_status()
+                
+                if stream:
+                    parts = []
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line.startswith(b'data: '):
+                            continue
+                        json_bytes = line[6:]  # 去掉'data: '前缀
+                        if json_bytes == b'[DONE]':
+                            break
+                        try:
+                            delta = _liai_answer(_json_loads(json_bytes))
+                        except (json.JSONDecodeError, UnicodeDecodeError):
+                            continue
+                        if delta:
+                            parts.append(delta)
+                    content = "".join(parts)
+                else:
+                    content = self._extract_liai_answer(await response.read())
+            
+            # 与同步实现一致：流式没拿到内容时用blocking模式重新请求一次
+            if stream and not content:
+                print("⚠️ Liai流式响应为空，改用blocking模式重试一次")
+                blocking_body, _ = _encode_json_body(dict(payload, response_mode="blocking"), compress)
+                async with session.post(url, data=blocking_body, headers=headers) as response:
+                    response.raise_for_status()
+                    content = self._extract_liai_answer(await response.read())
+            
+            if content.strip():
+                print(f"✅ Liai API密钥 ...{current_api_key[-8:]} 调用成功（异步）")
+                return content.strip()
+            raise Exception("API返回空内容")
+        
+        # 会话按事件循环共享，多次调用复用连接；最外层范围结束时关闭
+        async with _async_client_scope():
+            return await self._awith_key_failover(_call_once, "Liai API")
+    
+    def _call_api_for_json(self, system_prompt: str, user_text: str,
+                           on_page: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[str, Optional[str]]:
+        """
+        调用API并在流式接收的同时提取JSON
+
+        Returns:
+            Tuple: (完整回复内容, 流式提取出的JSON文本；无法确定时为None)
+        """
+        if on_page is None and not self.config.ai_stream_responses:
+            # 非流式：一次性返回完整内容，解析时再提取JSON
+            return self._call_api_with_prompt(system_prompt, user_text, stream=False), None
+        
+        parser = _PageStreamParser(parse_pages=on_page is not None)
+
+        def _on_delta(delta: str) -> None:
+            for page in parser.feed(delta):
+                on_page(page)
+
+        # 每个密钥的回复都从头开始，发起请求前清空扫描状态，截断判断只针对最终返回的那次回复
+        content = self._call_api_with_prompt(system_prompt, user_text, _on_delta, on_attempt=parser.reset)
+        if parser.truncated and len(self.api_keys) > 1:
+            # 流式结束时JSON仍未闭合，解析必然失败；不必等到解析阶段才报错，从下一个密钥开始再请求一轮
+            print("⚠️ AI回复的JSON未闭合（可能被截断），从下一个密钥开始重新请求（失败时继续切换密钥）")
+            parser.reset()
+            content = self._call_api_with_prompt(system_prompt, user_text, _on_delta, on_attempt=parser.reset)
+        return content, parser.extract_json_str(content)
+
+    def _call_api_with_prompt(self, system_prompt: str, user_text: str,
+                              on_delta: Optional[Callable[[str], None]] = None,
+                              stream: bool = True,
+                              on_attempt: Optional[Callable[[], None]] = None) -> str:
+        """
+        根据配置调用相应的API，on_delta在收到每段流式内容时回调；stream=False时一次性返回完整内容
+
+        on_attempt在每次使用一个密钥发起请求前回调（故障转移后回复会从头开始，调用方据此清空流式状态）
+        """
+        if self._is_liai:
             # 使用Liai API格式
-            return self._call_liai_api(system_prompt, user_text)
-        elif model_info.get('request_format') == 'streaming_compatible':
+            return self._call_liai_api(system_prompt, user_text, on_delta, stream, on_attempt)
+        elif self._is_streaming_compatible:
             # 使用火山引擎DeepSeek API格式
-            return self._call_deepseek_api(system_prompt, user_text)
+            return self._call_deepseek_api(system_prompt, user_text, on_delta, stream, on_attempt)
         else:
             # 标准OpenAI API格式
-            request_timeout = 60
-            actual_model = model_info.get('actual_model', self.config.ai_model)
-            
-            # 创建临时客户端（如果还没有）
-            if not hasattr(self, 'client'):
-                from openai import OpenAI
-                self.client = OpenAI(
-                    api_key=self._get_next_api_key(),
-                    base_url=self.base_url,
-                    timeout=request_timeout
-                )
+            return self._call_openai_api(system_prompt, user_text, on_delta, stream, on_attempt)
+    
+    def _call_openai_api(self, system_prompt: str, user_text: str,
+                         on_delta: Optional[Callable[[str], None]] = None,
+                         stream: bool = True,
+                         on_attempt: Optional[Callable[[], None]] = None) -> str:
+        """调用标准OpenAI接口（带故障转移的多密钥负载均衡），on_delta在收到每段流式内容时回调；stream=False时一次性返回"""
+        request_timeout = 60
+        actual_model = self.model_info.get('actual_model', self.config.ai_model)
+        
+        def _call_once(current_api_key: str) -> str:
+            # 每个密钥一个复用客户端，共享同一个连接池
+            client = _get_openai_client(current_api_key, self.base_url, request_timeout)
             
-            response = self.client.chat.completions.create(
+            response = client.chat.completions.create(
                 model=actual_model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_text}
                 ],
                 temperature=self.config.ai_temperature,
-                stream=True,
-                timeout=request_timeout
+                stream=stream,
+                timeout=request_timeout,
+                **self._completion_kwargs
             )
             
-            # 收集流式响应内容
-            content = ""
+            if not stream:
+                content = response.choices[0].message.content if response.choices else ""
+                return content.strip() if content else ""
+            
+            # 收集流式响应内容（片段收集后一次拼接）
+            parts = []
             for chunk in response:
                 if chunk.choices and chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
+                    delta = chunk.choices[0].delta.content
+                    parts.append(delta)
+                    if on_delta:
+                        on_delta(delta)
             
-            return content.strip() if content else ""
+            return "".join(parts).strip()
+        
+        # 尝试所有可用密钥
+        return self._with_key_failover(_call_once, on_attempt=on_attempt)
     
 
-    def _build_logical_structure_prompt_enhanced(self) -> str:
-        """构建AI内容整理模式的提示（三步逻辑框架）"""
-        return f"""你是一个资深PPT架构师。请按照以下**严格流程**将文本转化为PPT分页大纲：
-
-**第一步：全局分析**
-- 首先，通读全文，识别出文本的**核心逻辑结构**（如：引言->问题分析->数据论证->解决方案->总结）
-- 将整个文本划分为几个主要部分
-
-**第二步：逐部分分页**
-- 对于**每一个主要部分**，执行以下操作：
-  1. **提取核心论点**：找出这部分要证明的1个最终观点
-  2. **收集论据**：将所有支持该论点的段落、数据和论据集合起来
-  3. **合并成一页**：**将上述所有内容（核心论点+所有论据）共同作为一页PPT的文本内容**。即使内容很长，也先放在一起
-  4. **保留完整文本**：无论怎么分页，每一页都必须包含该页对应的完整用户原始文本，不能遗漏或截断
-
-**第三步：拆分例外规则**
-- **仅在以下情况下**，才允许将一页内容拆分成多页：
-  a. 包含了**两个完全独立的核心论点**
-
-**分页策略：**
-- **标题页（第1页）**：PPT封面页，不对应任何原文内容，自动生成标题和日期
-- **目录页（第2页）**：AI根据内容结构生成完整目录
-- **内容页（第3页开始）**：处理所有原文内容，按逻辑结构分页
-- **结尾页**：不生成结尾页（使用预设模板）
-
-**标题页处理规则：**
-- 标题页是PPT的封面，生成合适的PPT标题
-- 自动生成标题（基于内容主题）
-- original_text_segment与title相同，包含PPT标题
-- 所有原文内容都从第2页（目录）和第3页开始处理
-
-**页面类型说明：**
-- `title`: 标题页，仅包含文档标题和日期
-- `table_of_contents`: 目录页，必须包含各章节标题（不含页码）
-- `content`: 内容页，具体的要点和详细内容（分页重点）
-
-**字段要求：**
-pages字段里只需要包含：page_number/page_type/title/original_text_segment字段
-- **title字段**：必须准确概括该页内容（用于生成目录）
-- **original_text_segment字段最重要**：必须包含该页对应的完整原文片段，不能遗漏或截断
-
-**关键注意事项：**
-- **标题页original_text_segment**：与title相同，包含PPT标题
-- **目录页original_text_segment**：包含各章节标题，每行一个标题
-- **内容页original_text_segment**：包含该页面对应的所有原文内容，确保完整性
-- 不要生成结尾页，系统将使用预设的固定结尾页模板
-
-**输出格式要求：**
-严格按照以下JSON格式返回：
+    def split_texts_via_batch_api(self, texts: List[str], target_pages: Optional[int] = None,
+                                  poll_interval: int = 30) -> List[Dict[str, Any]]:
+        """
+        通过OpenAI Batch API离线批量分页（费用约为实时调用的一半，且不占用每分钟请求配额）
 
-```json
-[
-  {{
-    "page_number": 1,
-    "page_type": "title",
-    "title": "PPT标题（基于内容主题生成）",
-    "original_text_segment": "PPT标题（基于内容主题生成）"
-  }},
-  {{
-    "page_number": 2,
-    "page_type": "table_of_contents",
-    "title": "目录",
-    "original_text_segment": "主题一\n主题二\n主题三"
-  }},
-  {{
-    "page_number": 3,
-    "page_type": "content",
-    "title": "主题一标题",
-    "original_text_segment": "完整的主题一内容..."
-  }}
-]
-```
+        两次调用策略对应两轮批处理任务：第一轮整理逻辑结构，第二轮调整页数。
+        仅适用于标准OpenAI接口，适合不需要实时返回的批量任务。
 
-只返回JSON格式，不要其他文字。"""
+        Args:
+            texts: 待分页的文本列表
+            target_pages: 目标页面数量（可选，对所有文档生效）
+            poll_interval: 轮询批处理状态的间隔（秒）
 
+        Returns:
+            List[Dict]: 与texts顺序一致的分页结果，单个文档失败时为 {'success': False, 'error': ...}
+        """
+        if self._is_liai or self._is_streaming_compatible:
+            raise ValueError(f"当前模型不支持Batch API: {self.config.ai_model}")
 
-    def _build_page_adjustment_prompt(self, target_pages: Optional[int]) -> str:
-        """构建第二次调用的页数调整提示"""
-        if target_pages:
-            # 有指定目标页数：精确调整
-            ai_pages = target_pages - 1  # AI生成页数 = 总页数 - 结尾页
-            return f"""你是PPT页数精确调整专家。用户明确要求PPT总共{target_pages}页，你必须严格满足这个需求。
+        enqueue("AI批量分页(Batch API)", f"文档数量: {len(texts)}, 目标页数: {target_pages}")
+        client = _get_openai_client(self._get_next_api_key(), self.base_url, 120)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
 
-【系统限制】PPT最多25页（含封面+目录+内容+结尾），AI最多生成24页内容！
-【严格要求】你只需生成{ai_pages}页内容，系统会自动添加第{target_pages}页结尾页！
+        # 第一轮：分析内容逻辑结构
+        first_contents = self._run_chat_batch(client, self._build_logical_structure_prompt_enhanced(), texts, poll_interval)
+        first_results = {}
+        for index, content in enumerate(first_contents):
+            try:
+                first_results[index] = self._parse_ai_response_without_ending(content or "", texts[index])
+            except Exception as e:
+                results[index] = {'success': False, 'error': str(e)}
 
-**PPT页数调整任务：**
-基于第一次AI分析结果，重新组织PPT内容以精确满足用户的{target_pages}页要求：
+        # 第二轮：基于第一轮结果调整页数
+        indices = list(first_results)
+        second_inputs = [self._format_first_result_for_second_call(first_results[i]) for i in indices]
+        second_contents = self._run_chat_batch(client, self._build_page_adjustment_prompt(target_pages), second_inputs, poll_interval)
+        for index, content in zip(indices, second_contents):
+            try:
+                second_result = self._parse_ai_response(content or "", texts[index])
+            except Exception as e:
+                results[index] = {'success': False, 'error': str(e)}
+                continue
+            second_result['is_two_pass_result'] = True
+            second_result['first_pass_pages'] = first_results[index]['analysis']['total_pages'] + 1
+            second_result['final_pass_pages'] = second_result['analysis']['total_pages']
+            results[index] = second_result
 
-**页面分配：**
-- 你负责生成：{ai_pages}页内容（第1页到第{ai_pages}页）
-- 系统自动添加：第{target_pages}页结尾页
-- 最终PPT总页数：{target_pages}页（完全符合用户要求）
+        return results
 
-**调整策略：**
-- 保持标题页(第1页)和目录页(第2页)不变
-- 内容页范围：第3页到第{ai_pages}页
-- 通过合并或拆分内容页来精确达到{ai_pages}页
-- 确保每页内容充实，符合PPT展示标准
+    def split_texts_multiplexed(self, texts: List[str], target_pages: Optional[int] = None,
+                                per_request: int = 5) -> List[Dict[str, Any]]:
+        """
+        将多个短文档合并到同一次请求中分页，减少HTTP往返和重复的系统提示词token
 
-**字段要求：**
-pages字段里只需要包含：page_number/page_type/title/original_text_segment字段
-- **title字段**：必须准确概括该页内容
-- **original_text_segment字段**：包含该页对应的完整原文片段，不能遗漏
+        Args:
+            texts: 待分页的文本列表
+            target_pages: 目标页面数量（可选，对所有文档生效）
+            per_request: 每次请求合并的文档数量
 
-严格按JSON格式返回，必须生成{ai_pages}页：
+        Returns:
+            List[Dict]: 与texts顺序一致的分页结果，单个文档失败时为 {'success': False, 'error': ...}
+        """
+        enqueue("AI合并分页", f"文档数量: {len(texts)}, 每次请求: {per_request}")
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        first_prompt = self._build_logical_structure_prompt_enhanced() + _MULTI_DOCUMENT_INSTRUCTION
+        second_prompt = self._build_page_adjustment_prompt(target_pages) + _MULTI_DOCUMENT_INSTRUCTION
 
-```json
-[
-  {{
-    "page_number": 1,
-    "page_type": "title",
-    "title": "PPT标题",
-    "original_text_segment": "PPT标题"
-  }},
-  {{
-    "page_number": 2,
-    "page_type": "table_of_contents",
-    "title": "目录",
-    "original_text_segment": "目录内容"
-  }},
-  {{
-    "page_number": 3,
-    "page_type": "content",
-    "title": "内容页标题",
-    "original_text_segment": "页面内容"
-  }}
-]
-```
+        for start in range(0, len(texts), per_request):
+            indices = list(range(start, min(start + per_request, len(texts))))
 
-只返回JSON，不要其他文字。"""
-        else:
-            # 无指定目标页数：优化减少页数
-            return f"""你是PPT内容优化专家。基于第一次AI分析结果，优化PPT页数分配，解决过度分页问题。
+            # 第一次调用：分析内容逻辑结构
+            try:
+                first_pages = self._call_multiplexed(first_prompt, {i: texts[i] for i in indices})
+            except Exception as e:
+                for i in indices:
+                    results[i] = {'success': False, 'error': str(e)}
+                continue
+
+            first_results = {}
+            for i in indices:
+                if first_pages[i] is None:
+                    results[i] = {'success': False, 'error': 'AI未返回该文档的分页结果'}
+                    continue
+                try:
+                    first_results[i] = self._build_split_result(first_pages[i])
+                except Exception as e:
+                    results[i] = {'success': False, 'error': str(e)}
+
+            # 第二次调用：基于第一次结果调整页数
+            try:
+                second_pages = self._call_multiplexed(second_prompt, {
+                    i: self._format_first_result_for_second_call(first_result)
+                    for i, first_result in first_results.items()
+                })
+            except Exception as e:
+                for i in first_results:
+                    results[i] = {'success': False, 'error': str(e)}
+                continue
 
-【系统限制】PPT最多25页（含封面+目录+内容+结尾），AI最多生成24页内容！
-【PPT分页优化任务】
-PPT制作中，AI容易过度分页导致页面内容稀薄。你需要通过合并相关主题的内容页来优化页数：
+            for i, first_result in first_results.items():
+                if second_pages[i] is None:
+                    results[i] = {'success': False, 'error': 'AI未返回该文档的分页结果'}
+                    continue
+                try:
+                    second_result = self._build_split_result(second_pages[i])
+                except Exception as e:
+                    results[i] = {'success': False, 'error': str(e)}
+                    continue
+                self._add_ending_page(second_result)
+                second_result['is_two_pass_result'] = True
+                second_result['first_pass_pages'] = first_result['analysis']['total_pages'] + 1
+                second_result['final_pass_pages'] = second_result['analysis']['total_pages']
+                results[i] = second_result
 
-**分页原则：**
-- 保持标题页(第1页)和目录页(第2页)不变
-- 合并逻辑相关的内容页（如"产品介绍"+"产品特点"合并为一页）
-- 优化后的AI生成页数应比第一次结果更少（系统会自动添加结尾页）
-- 【重要】AI生成页数不得超过24页（总体25页限制减去结尾页）
-- **【严格300字限制】除了标题页、目录页和结尾页，所有内容页的original_text_segment必须包含至少300字原始文本，不足300字的页面必须与相邻页面合并**
+        return results
 
-**字段要求：**
-pages字段里只需要包含：page_number/page_type/title/original_text_segment字段
-- **title字段**：必须准确概括该页内容
-- **original_text_segment字段**：包含该页对应的完整原文片段，不能遗漏
+    def _call_multiplexed(self, system_prompt: str, documents: Dict[int, str]) -> Dict[int, Any]:
+        """合并多个文档发起一次调用，返回文档编号到对应pages数据的映射（缺失的文档为None）"""
+        if not documents:
+            return {}
+        user_text = json.dumps(
+            {"documents": [{"id": doc_id, "text": text} for doc_id, text in documents.items()]},
+            ensure_ascii=False
+        )
+        content = self._call_api_with_prompt(system_prompt, user_text, stream=self.config.ai_stream_responses)
+        parsed_data = _json_loads(_extract_json_str(content))
+        items = parsed_data.get('results', []) if isinstance(parsed_data, dict) else parsed_data
 
-严格按JSON格式返回：
+        pages_by_id = dict.fromkeys(documents)
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            # 模型有时把编号写成字符串（"1"），统一转换为整数再匹配
+            try:
+                doc_id = int(str(item.get('id')).strip())
+            except ValueError:
+                continue
+            if doc_id in pages_by_id:
+                pages_by_id[doc_id] = item.get('pages')
+        return pages_by_id
 
-```json
-[
-  {{
-    "page_number": 1,
-    "page_type": "title",
-    "title": "PPT标题",
-    "original_text_segment": "PPT标题"
-  }},
-  {{
-    "page_number": 2,
-    "page_type": "table_of_contents",
-    "title": "目录",
-    "original_text_segment": "目录内容"
-  }},
-  {{
-    "page_number": 3,
-    "page_type": "content",
-    "title": "内容页标题",
-    "original_text_segment": "页面内容"
-  }}
-]
-```
+    def _run_chat_batch(self, client: OpenAI, system_prompt: str, user_texts: List[str],
+                        poll_interval: int) -> List[Optional[str]]:
+        """提交一轮chat.completions批处理任务并等待完成，返回与输入顺序一致的回复内容"""
+        if not user_texts:
+            return []
 
-只返回JSON，不要其他文字。"""
+        model_info = self.model_info
+        actual_model = model_info.get('actual_model', self.config.ai_model)
+
+        # 每个请求一行JSONL，通过custom_id还原顺序
+        lines = []
+        for index, user_text in enumerate(user_texts):
+            lines.append(json.dumps({
+                "custom_id": f"doc-{index}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": actual_model,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_text}
+                    ],
+                    "temperature": self.config.ai_temperature,
+                    **self._completion_kwargs
+                }
+            }, ensure_ascii=False))
+        batch_file = client.files.create(
+            file=("page_split_batch.jsonl", "\n".join(lines).encode('utf-8')),
+            purpose="batch"
+        )
+
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"📦 已提交Batch任务 {batch.id}，共 {len(user_texts)} 个请求")
+
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+
+        if batch.status != 'completed' or not batch.output_file_id:
+            raise RuntimeError(f"Batch任务 {batch.id} 未成功完成，状态: {batch.status}")
+
+        contents: List[Optional[str]] = [None] * len(user_texts)
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            item = _json_loads(line)
+            index = int(item['custom_id'].split('-', 1)[1])
+            body = (item.get('response') or {}).get('body') or {}
+            choices = body.get('choices') or []
+            if choices:
+                contents[index] = (choices[0].get('message', {}).get('content') or "").strip()
+
+        return contents
+
+    def _build_logical_structure_prompt_enhanced(self) -> str:
+        """构建AI内容整理模式的提示（三步逻辑框架）"""
+        return _LOGICAL_STRUCTURE_PROMPT
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def _build_page_adjustment_prompt(target_pages: Optional[int]) -> str:
+        """构建第二次调用的页数调整提示（按目标页数缓存）"""
+        if target_pages:
+            # 有指定目标页数：静态主体保持逐字节不变，页数要求追加在末尾，便于服务端前缀缓存命中
+            ai_pages = target_pages - 1  # AI生成页数 = 总页数 - 结尾页
+            return _PAGE_ADJUSTMENT_PROMPT + _TARGET_PAGES_INSTRUCTION.format(
+                target_pages=target_pages, ai_pages=ai_pages
+            )
+        else:
+            # 无指定目标页数：优化减少页数
+            return _PAGE_OPTIMIZATION_PROMPT
 
     def _format_first_result_for_second_call(self, first_result: Dict[str, Any]) -> str:
-        """将第一次调用结果格式化为第二次调用的输入"""
-        formatted_text = "【第一次AI分析结果】\n\n"
-        
+        """将第一次调用结果格式化为第二次调用的输入（片段收集后一次拼接）"""
         # 添加分析信息
         analysis = first_result.get('analysis', {})
-        formatted_text += f"原始分析：总页数{analysis.get('total_pages', 0)}页，{analysis.get('split_strategy', '未知策略')}\n\n"
+        parts = [
+            "【第一次AI分析结果】\n\n",
+            f"原始分析：总页数{analysis.get('total_pages', 0)}页，{analysis.get('split_strategy', '未知策略')}\n\n",
+            "【页面详情】\n"
+        ]
         
         # 添加每页的详细内容
-        pages = first_result.get('pages', [])
-        formatted_text += "【页面详情】\n"
-        for page in pages:
-            page_num = page.get('page_number', 0)
-            page_type = page.get('page_type', 'content')
-            title = page.get('title', '无标题')
-            original_text = page.get('original_text_segment', '')
-            
-            formatted_text += f"\n第{page_num}页 ({page_type}): {title}\n"
-            formatted_text += f"内容: {original_text}\n"
-            formatted_text += "---\n"
+        parts.extend(
+            f"\n第{page.get('page_number', 0)}页 ({page.get('page_type', 'content')}): {page.get('title', '无标题')}\n"
+            f"内容: {page.get('original_text_segment', '')}\n"
+            "---\n"
+            for page in first_result.get('pages', [])
+        )
         
         # 注：原始文本已在各页面的original_text_segment中包含，无需重复添加
         
-        return formatted_text
+        return "".join(parts)
 
     
-    def _parse_ai_response_without_ending(self, content: str, user_text: str) -> Dict[str, Any]:
+    def _parse_ai_response_without_ending(self, content: str, user_text: str,
+                                          json_str: Optional[str] = None) -> SplitResultDict:
         """解析AI响应结果（不添加结尾页）"""
-        result = self._parse_ai_response_base(content, user_text)
+        result = self._parse_ai_response_base(content, user_text, json_str)
         return result
     
-    def _parse_ai_response(self, content: str, user_text: str) -> Dict[str, Any]:
+    def _parse_ai_response(self, content: str, user_text: str,
+                           json_str: Optional[str] = None) -> SplitResultDict:
         """解析AI响应结果（添加结尾页）"""
-        result = self._parse_ai_response_base(content, user_text)
+        result = self._parse_ai_response_base(content, user_text, json_str)
         
         # 添加固定的结尾页
         self._add_ending_page(result)
         
         return result
     
-    def _parse_ai_response_base(self, content: str, user_text: str) -> Dict[str, Any]:
-        """解析AI响应结果的基础方法"""
+    def _parse_ai_response_base(self, content: str, user_text: str,
+                                json_str: Optional[str] = None) -> SplitResultDict:
+        """解析AI响应结果的基础方法（json_str为流式接收时已提取出的JSON文本）"""
         try:
             # 检查返回内容是否为空
             if not content or not content.strip():
@@ -574,13 +1769,16 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
                 print(f"❌ {error_detail}")
                 raise ValueError(error_detail)
             
-            # 提取JSON内容（支持对象{}和数组[]）
-            json_match = re.search(r'```(?:json)?\s*([{\[].*?[}\]])\s*```', content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                # 如果没有代码块，尝试直接解析
-                json_str = content.strip()
+            # 提取JSON内容（支持对象{}和数组[]），流式接收时已提取的直接使用
+            if json_str is None:
+                # 回复本身就是JSON（JSON模式或模型未加代码块）时直接解析，失败再走提取
+                stripped = content.strip()
+                if stripped[:1] in ('{', '['):
+                    try:
+                        return self._build_split_result(_json_loads(stripped))
+                    except json.JSONDecodeError:
+                        pass
+                json_str = _extract_json_str(content)
             
             if not json_str or not json_str.strip():
                 error_detail = "提取的JSON字符串为空"
@@ -594,34 +1792,11 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
                 raise ValueError(error_detail)
             
             # 解析JSON
-            parsed_data = json.loads(json_str)
+            parsed_data = _json_loads(json_str)
             
-            # 如果返回的是数组，转换为标准格式
-            if isinstance(parsed_data, list):
-                result = {
-                    'pages': parsed_data,
-                    'analysis': {
-                        'total_pages': len(parsed_data),
-                        'content_type': '自动生成',
-                        'split_strategy': '智能分页'
-                    }
-                }
-            else:
-                result = parsed_data
-            
-            # 验证结果格式
-            validation_result = self._validate_split_result(result)
-            if not validation_result['is_valid']:
-                error_detail = f"AI返回的JSON格式不符合要求: {validation_result['error']}"
-                print(f"❌ {error_detail}")
-                print(f"🔍 JSON内容: {json.dumps(result, ensure_ascii=False, indent=2)[:1000]}...")
-                raise ValueError(error_detail)
-            
-            result['success'] = True
-
-            return result
+            return self._build_split_result(parsed_data)
                 
-        except json.JSONDecodeError as e:
+        except json.JSONDecodeError as e:  # orjson.JSONDecodeError也是其子类
             json_str_safe = json_str[:500] if 'json_str' in locals() else '未获取到'
             error_msg = f"JSON解析失败: {e}\n尝试解析的内容: {json_str_safe}"
             print(f"❌ {error_msg}")
@@ -636,63 +1811,116 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
             
             raise e
     
+    def _build_split_result(self, parsed_data: Any) -> SplitResultDict:
+        """将解析出的JSON数据转换为标准分页结果并验证格式"""
+        # 如果返回的是数组，转换为标准格式
+        if isinstance(parsed_data, list):
+            result = {
+                'pages': parsed_data,
+                'analysis': self._default_analysis(parsed_data)
+            }
+        else:
+            result = parsed_data
+            # JSON模式下模型必须返回对象，常见的是只有pages没有analysis的{"pages": [...]}，按数组的方式补全
+            if (isinstance(result, dict) and 'analysis' not in result
+                    and isinstance(result.get('pages'), list)):
+                result['analysis'] = self._default_analysis(result['pages'])
+        
+        # 验证结果格式
+        validation_result = self._validate_split_result(result)
+        if not validation_result['is_valid']:
+            error_detail = f"AI返回的JSON格式不符合要求: {validation_result['error']}"
+            print(f"❌ {error_detail}")
+            print(f"🔍 JSON内容: {_json_preview(result, 1000)}...")
+            raise ValueError(error_detail)
+        
+        result['success'] = True
+
+        return result
+    
+    @staticmethod
+    def _default_analysis(pages: List[Any]) -> AnalysisDict:
+        """AI只返回了页面列表时补全的analysis"""
+        return {
+            'total_pages': len(pages),
+            'content_type': '自动生成',
+            'split_strategy': '智能分页'
+        }
+    
     def _validate_split_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """验证分页结果的格式"""
-        try:
-            # 检查必需的字段
-            if 'analysis' not in result:
-                return {'is_valid': False, 'error': '缺少analysis字段'}
-            if 'pages' not in result:
-                return {'is_valid': False, 'error': '缺少pages字段'}
-            
-            analysis = result['analysis']
-            pages = result['pages']
-            
-            # 检查analysis字段
-            required_analysis_fields = ['total_pages', 'content_type', 'split_strategy']
-            for field in required_analysis_fields:
-                if field not in analysis:
-                    return {'is_valid': False, 'error': f'analysis缺少字段: {field}'}
-            
-            # 检查pages数组
-            if not isinstance(pages, list):
-                return {'is_valid': False, 'error': 'pages不是数组类型'}
-            if len(pages) == 0:
-                return {'is_valid': False, 'error': 'pages数组为空'}
-            
-            # 检查每个页面的字段
-            required_page_fields = ['page_number', 'page_type', 'title', 'original_text_segment']
-            for i, page in enumerate(pages):
-                for field in required_page_fields:
-                    if field not in page:
-                        return {'is_valid': False, 'error': f'第{i+1}个页面缺少字段: {field}'}
-                
-                # 检查original_text_segment是字符串
-                if not isinstance(page['original_text_segment'], str):
-                    return {'is_valid': False, 'error': f'第{i+1}个页面的original_text_segment不是字符串类型'}
-            
+        # 检查必需的字段
+        if not isinstance(result, dict):
+            return {'is_valid': False, 'error': '分页结果不是对象类型'}
+        if 'analysis' not in result:
+            return {'is_valid': False, 'error': '缺少analysis字段'}
+        if 'pages' not in result:
+            return {'is_valid': False, 'error': '缺少pages字段'}
+        
+        validation = self._validate_analysis(result['analysis'])
+        if not validation['is_valid']:
+            return validation
+        
+        pages = result['pages']
+        if not isinstance(pages, list):
+            return {'is_valid': False, 'error': 'pages不是数组类型'}
+        if len(pages) == 0:
+            return {'is_valid': False, 'error': 'pages数组为空'}
+        
+        return self._validate_pages(pages)
+    
+    @staticmethod
+    def _validate_analysis(analysis: Any) -> Dict[str, Any]:
+        """验证analysis字段的格式"""
+        if not isinstance(analysis, dict):
+            return {'is_valid': False, 'error': 'analysis不是对象类型'}
+        if not _REQUIRED_ANALYSIS_FIELD_SET.issubset(analysis):
+            field = next(f for f in _REQUIRED_ANALYSIS_FIELDS if f not in analysis)
+            return {'is_valid': False, 'error': f'analysis缺少字段: {field}'}
+        return {'is_valid': True, 'error': None}
+    
+    @staticmethod
+    def _validate_pages(pages: List[Any], start: int = 0) -> Dict[str, Any]:
+        """
+        验证页面列表的格式，只检查pages[start:]
+
+        流式解析时每收到新页面只需校验新增部分，不必重复遍历已校验的前缀
+        """
+        # 快速路径：全部合法时一次all()完成校验，只有出错时才逐页定位具体错误
+        if all(
+            isinstance(page, dict)
+            and _REQUIRED_PAGE_FIELD_SET.issubset(page)
+            and type(page['original_text_segment']) is str
+            for page in itertools.islice(pages, start, None)
+        ):
             return {'is_valid': True, 'error': None}
+        
+        for i in range(start, len(pages)):
+            page = pages[i]
+            if not isinstance(page, dict):
+                return {'is_valid': False, 'error': f'第{i+1}个页面不是对象类型'}
+            if not _REQUIRED_PAGE_FIELD_SET.issubset(page):
+                field = next(f for f in _REQUIRED_PAGE_FIELDS if f not in page)
+                return {'is_valid': False, 'error': f'第{i+1}个页面缺少字段: {field}'}
             
-        except Exception as e:
-            return {'is_valid': False, 'error': f'验证过程中出现异常: {str(e)}'}
+            # 检查original_text_segment是字符串
+            if not isinstance(page['original_text_segment'], str):
+                return {'is_valid': False, 'error': f'第{i+1}个页面的original_text_segment不是字符串类型'}
+        
+        return {'is_valid': True, 'error': None}
     
-    def _create_fallback_split(self, user_text: str) -> Dict[str, Any]:
+    def _create_fallback_split(self, user_text: str) -> SplitResultDict:
         """创建备用分页方案"""
-        # 按行分割，找到标题
-        lines = [line.strip() for line in user_text.split('\n') if line.strip()]
-        if not lines:
-            lines = [user_text.strip()]
+        # 第一行作为标题，其余按段落拆分为正文
+        first_line, remaining_paragraphs = self._split_title_and_paragraphs(user_text)
         
         # 提取标题（通常是第一行，且相对较短）
-        title = lines[0] if lines else "内容展示"
-        if len(title) > 50:  # 如果第一行太长，可能不是标题，截取前面部分
-            title = title[:30] + "..."
+        title = _truncate(first_line, 50, keep=30)  # 如果第一行太长，可能不是标题，截取前面部分
         
         pages = []
         
         # 创建标题页（仅包含从文本开头提取的标题和日期）
-        import datetime
-        current_date = datetime.datetime.now().strftime("%Y年%m月")
+        current_date = datetime.now().strftime("%Y年%m月")
         
         pages.append({
             "page_number": 1,
@@ -702,35 +1930,17 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
             "original_text_segment": title  # 只包含标题部分
         })
         
-        # 将除标题外的所有内容分配到第3页开始的内容页（第2页是固定目录页）
-        # 重新组织内容：去掉标题行后的所有文本
-        remaining_text = user_text
-        if lines and len(lines) > 1:
-            # 去掉第一行（标题），保留其余内容
-            title_end_pos = user_text.find(lines[0]) + len(lines[0])
-            remaining_text = user_text[title_end_pos:].strip()
-        
-        # 按段落分割剩余内容
-        remaining_paragraphs = [p.strip() for p in remaining_text.split('\n\n') if p.strip()]
-        if not remaining_paragraphs and remaining_text:
-            remaining_paragraphs = [remaining_text]
-        
-        page_num = 3  # 从第3页开始（第2页是固定目录页）
-        if remaining_paragraphs:
-            for i, paragraph in enumerate(remaining_paragraphs):
-                # 限制总页数不超过23页（为目录页和结尾页预留空间）
-                if page_num > 23:
-                    print(f"警告：内容过多，已达到23页上限，剩余{len(remaining_paragraphs) - i}段内容将被省略")
-                    break
-                    
-                pages.append({
-                    "page_number": page_num,
-                    "page_type": "content",
-                    "title": f"内容 {page_num - 2}",
-                    "original_text_segment": paragraph
-                })
-                page_num += 1
-        else:
+        # 将除标题外的所有内容分配到第3页开始的内容页（第2页是固定目录页），内容序号从1开始；
+        # 段落按需从生成器中取出，islice限制总页数不超过23页（为目录页和结尾页预留空间）
+        for content_idx, paragraph in enumerate(itertools.islice(remaining_paragraphs, _FALLBACK_MAX_CONTENT_PAGES), start=1):
+            pages.append({
+                "page_number": content_idx + 2,
+                "page_type": "content",
+                "title": f"内容 {content_idx}",
+                "original_text_segment": paragraph
+            })
+        
+        if len(pages) == 1:
             # 如果没有剩余内容，至少创建一个空的内容页
             pages.append({
                 "page_number": 3,
@@ -738,6 +1948,10 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
                 "title": "内容页",
                 "original_text_segment": "无额外内容"
             })
+        else:
+            omitted = sum(1 for _ in remaining_paragraphs)
+            if omitted:
+                print(f"警告：内容过多，已达到23页上限，剩余{omitted}段内容将被省略")
         
         result = {
             "success": True,
@@ -757,33 +1971,54 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
         
         return result
     
+    @staticmethod
+    def _split_title_and_paragraphs(user_text: str) -> Tuple[str, Iterator[str]]:
+        """
+        一次遍历拆出标题行和正文段落
+
+        标题为第一行；正文为其余文本按空行分段（只有一行时全文作为正文），段落以生成器按需产出
+        """
+        text = user_text.strip()
+        newline = text.find('\n')
+        if newline < 0:
+            first_line, rest = text, ''
+        else:
+            first_line, rest = text[:newline].strip(), text[newline + 1:].strip()
+        
+        # 去掉第一行（标题），保留其余内容；只有一行时全文作为内容
+        remaining_text = rest or user_text
+        
+        def _paragraphs() -> Iterator[str]:
+            found = False
+            for segment in _PARA_SPLIT_RE.split(remaining_text):
+                paragraph = segment.strip()
+                if paragraph:
+                    found = True
+                    yield paragraph
+            if not found and remaining_text:
+                yield remaining_text
+        
+        return first_line, _paragraphs()
+    
     def _add_table_of_contents_page(self, result: Dict[str, Any]) -> None:
         """添加动态目录页（第2页）"""
-        import os
-        
         pages = result.get('pages', [])
         if not pages:
             return
         
-        # 调整现有页面的页码（为目录页腾出第2页位置）
-        for page in pages:
-            if page.get('page_number', 1) > 1:
-                page['page_number'] = page['page_number'] + 1
-        
-        # 提取所有内容页的标题信息，生成动态目录
+        # 一次遍历：调整现有页面的页码（为目录页腾出第2页位置），同时提取内容页标题生成动态目录
         content_titles = []
         for page in pages:
+            page_number = page.get('page_number', 0)
+            if page_number > 1:
+                page_number += 1
+                page['page_number'] = page_number
+            
             if page.get('page_type') == 'content' and page.get('title'):
-                page_number = page.get('page_number', 0)
-                title = page.get('title', '').strip()
+                title = page['title'].strip()
                 subtitle = page.get('subtitle', '').strip()
-                
-                # 构建目录项
-                if subtitle:
-                    toc_item = f"{page_number}. {title} - {subtitle}"
-                else:
-                    toc_item = f"{page_number}. {title}"
-                content_titles.append(toc_item)
+                # 有副标题时附在标题后
+                content_titles.append(f"{page_number}. {title} - {subtitle}" if subtitle else f"{page_number}. {title}")
         
         # 如果没有提取到标题，使用默认目录
         if not content_titles:
@@ -792,20 +2027,8 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
                 "章节结构预览"
             ]
         
-        # 创建动态目录页信息
-        table_of_contents_page = {
-            "page_number": 2,
-            "page_type": "table_of_contents",
-            "title": "目录",
-            "original_text_segment": "",
-            "template_path": os.path.join("templates", "table_of_contents_slides.pptx"),
-            "is_toc_page": True,  # 标记为目录页
-            "skip_dify_api": True,  # 不需要调用Dify API，但内容已动态提取
-            "toc_items": content_titles  # 将目录项单独存储
-        }
-        
-        # 将目录页插入到第2位
-        pages.insert(1, table_of_contents_page)
+        # 基于模板创建动态目录页，目录项单独存储，插入到第2位
+        pages.insert(1, {**_TOC_PAGE_TEMPLATE, "toc_items": content_titles})
         
         # 更新分析信息中的总页数
         if 'analysis' in result:
@@ -813,78 +2036,78 @@ pages字段里只需要包含：page_number/page_type/title/original_text_segmen
     
     def _add_ending_page(self, result: Dict[str, Any]) -> None:
         """添加固定的结尾页"""
-        import os
-        
         pages = result.get('pages', [])
         if not pages:
             return
         
-        # 计算结尾页的页码
-        ending_page_number = len(pages) + 1
-        
-        # 添加结尾页信息
-        ending_page = {
-            "page_number": ending_page_number,
-            "page_type": "ending",
-            "title": "谢谢观看",
-            "original_text_segment": "",
-            "template_path": os.path.join("templates", "ending_slides.pptx"),
-            "is_fixed_template": True,
-            "skip_dify_api": True  # 标记为跳过Dify API调用
-        }
+        # 结尾页紧接最后一页的页码（不依赖页码与列表位置一致）；AI返回的页码不是整数时按页数推算
+        last_page_number = pages[-1].get('page_number')
+        if isinstance(last_page_number, int) and not isinstance(last_page_number, bool):
+            ending_page_number = last_page_number + 1
+        else:
+            ending_page_number = len(pages) + 1
         
-        pages.append(ending_page)
+        # 基于模板添加结尾页信息
+        pages.append({**_ENDING_PAGE_TEMPLATE, "page_number": ending_page_number})
         
         # 更新总页数
         if 'analysis' in result:
             result['analysis']['total_pages'] = len(pages)
 
+
+# 页面类型的展示名称
+_PAGE_TYPE_MAP = {
+    "title": "🏷️ 标题页",
+    "overview": "📋 概述页",
+    "table_of_contents": "📑 目录页",
+    "content": "📄 内容页",
+    "ending": "🔚 结束页"
+}
+
+
 class PageContentFormatter:
     """页面内容格式化工具"""
     
     @staticmethod
     def format_page_preview(page: Dict[str, Any]) -> str:
         """格式化页面预览文本"""
-        page_type_map = {
-            "title": "🏷️ 标题页",
-            "overview": "📋 概述页",
-            "table_of_contents": "📑 目录页", 
-            "content": "📄 内容页",
-            "ending": "🔚 结束页"
-        }
-        
-        page_type_display = page_type_map.get(page.get('page_type', 'content'), "📄 内容页")
+        page_type = page.get('page_type', 'content')
+        page_type_display = _PAGE_TYPE_MAP.get(page_type, "📄 内容页")
         
-        preview = f"**{page_type_display} - 第{page.get('page_number', 1)}页**\n\n"
-        preview += f"**标题：** {page.get('title', '未设置标题')}\n"
+        parts = [
+            f"**{page_type_display} - 第{page.get('page_number', 1)}页**\n\n",
+            f"**标题：** {page.get('title', '未设置标题')}\n"
+        ]
         
         # 标题页特殊处理
-        if page.get('page_type') == 'title':
-            if page.get('date'):
-                preview += f"**日期：** {page.get('date')}\n"
-            preview += f"**说明：** 标题页使用固定模板，其他内容（作者、机构等）将自动填充\n\n"
+        if page_type == 'title':
+            date = page.get('date')
+            if date:
+                parts.append(f"**日期：** {date}\n")
+            parts.append("**说明：** 标题页使用固定模板，其他内容（作者、机构等）将自动填充\n\n")
         
         # 显示原文片段
         original_text = page.get('original_text_segment', '')
         if original_text and original_text.strip():
-            preview += "**原文内容：**\n"
+            parts.append("**原文内容：**\n")
             # 如果原文太长，显示前200字符
-            if len(original_text) > 200:
-                preview += f"{original_text[:200]}...\n"
-            else:
-                preview += f"{original_text}\n"
+            parts.append(_truncate(original_text, 200))
+            parts.append("\n")
         
-        return preview
+        return "".join(parts)
     
     @staticmethod
     def format_analysis_summary(analysis: Dict[str, Any]) -> str:
         """格式化分析摘要"""
-        summary = f"**📊 分页分析结果**\n\n"
-        summary += f"• **总页数：** {analysis.get('total_pages', 0)} 页\n"
-        summary += f"• **内容类型：** {analysis.get('content_type', '未知')}\n"
-        summary += f"• **分页策略：** {analysis.get('split_strategy', '未知')}\n"
+        parts = [
+            "**📊 分页分析结果**\n\n",
+            f"• **总页数：** {analysis.get('total_pages', 0)} 页\n",
+            f"• **内容类型：** {analysis.get('content_type', '未知')}\n",
+            f"• **分页策略：** {analysis.get('split_strategy', '未知')}\n"
+        ]
         
-        if analysis.get('reasoning'):
-            summary += f"• **分析说明：** {analysis.get('reasoning')}\n"
+        reasoning = analysis.get('reasoning')
+        if reasoning:
+            parts.append(f"• **分析说明：** {reasoning}\n")
         
-        return summary 
\ No newline at end of file
+        return "".join(parts)
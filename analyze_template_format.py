@@ -7,12 +7,41 @@ PPT模板格式分析工具
 
 import os
 import sys
-from typing import Dict, Any, List
+import json
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 from pptx import Presentation
 from pptx.util import Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+@lru_cache(maxsize=256)
+def _rgb_str(r: int, g: int, b: int) -> str:
+    """
+    颜色字符串，调用方式为 _rgb_str(*rgb)（RGBColor 是 (r, g, b) 元组，没有 red/green/blue 属性）
+    模板里的颜色种类很少，缓存后相同颜色复用同一个字符串对象
+    """
+    return f"RGB({r}, {g}, {b})"
+
+def _trunc(text: str, limit: int) -> str:
+    """超过limit个字符时截断并追加省略号"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _enum_name(value) -> Optional[str]:
+    """枚举成员名（如 TEXT_BOX、SOLID），直接读.name，省去str(enum)的格式化；未设置时为None"""
+    return None if value is None else value.name
+
+def _emu_int(value) -> Optional[int]:
+    """将python-pptx的Emu（int子类）转为普通int，序列化时无需走default回退；未设置时保持None"""
+    return None if value is None else int(value)
+
 def analyze_template_format(template_path: str) -> Dict[str, Any]:
     """
     深度分析PPT模板的格式信息
@@ -32,16 +61,20 @@ def analyze_template_format(template_path: str) -> Dict[str, Any]:
             "file_path": template_path,
             "slide_count": len(ppt.slides),
             "slide_size": {
-                "width": ppt.slide_width,
-                "height": ppt.slide_height
+                "width": _emu_int(ppt.slide_width),
+                "height": _emu_int(ppt.slide_height)
             },
             "slides": []
         }
         
         for slide_idx, slide in enumerate(ppt.slides):
+            try:
+                layout_name = slide.slide_layout.name
+            except AttributeError:
+                layout_name = "Unknown"
             slide_info = {
                 "slide_index": slide_idx,
-                "layout_name": slide.slide_layout.name if hasattr(slide.slide_layout, 'name') else "Unknown",
+                "layout_name": layout_name,
                 "background": analyze_background(slide),
                 "shapes": [],
                 "color_scheme": analyze_color_scheme(slide),
@@ -71,21 +104,22 @@ def analyze_background(slide) -> Dict[str, Any]:
         "fill_type": None
     }
     
+    fill = slide.background.fill
+    background_info["fill_type"] = _enum_name(fill.type)
+    
+    # 非纯色填充读取fore_color会抛TypeError，此时不记录颜色
+    try:
+        fore_color = fill.fore_color
+    except TypeError:
+        return background_info
+    
+    # 主题色/未设置颜色时读取rgb会抛AttributeError
     try:
-        if hasattr(slide, 'background'):
-            bg = slide.background
-            if hasattr(bg, 'fill'):
-                fill = bg.fill
-                background_info["fill_type"] = str(fill.type) if hasattr(fill, 'type') else None
-                
-                if hasattr(fill, 'fore_color') and fill.fore_color:
-                    try:
-                        rgb = fill.fore_color.rgb
-                        background_info["color"] = f"RGB({rgb.red}, {rgb.green}, {rgb.blue})"
-                    except:
-                        background_info["color"] = "Cannot determine"
-    except:
-        pass
+        rgb = fore_color.rgb
+    except (AttributeError, ValueError):
+        background_info["color"] = "Cannot determine"
+    else:
+        background_info["color"] = _rgb_str(*rgb)
     
     return background_info
 
@@ -97,79 +131,89 @@ def analyze_color_scheme(slide) -> Dict[str, Any]:
         "accent_colors": []
     }
     
-    try:
-        if hasattr(slide, 'color_scheme'):
-            # 尝试提取颜色方案信息
-            pass
-    except:
-        pass
-    
+    # python-pptx的Slide没有颜色方案接口，暂不提取
     return colors
 
 def analyze_shape(shape, shape_idx: int) -> Dict[str, Any]:
     """分析单个形状的详细信息"""
+    # python-pptx的属性由描述符按需读取XML，hasattr探测后再访问等于读两遍，这里每个属性只取一次
+    try:
+        shape_type = _enum_name(shape.shape_type) or "Unknown"
+    except AttributeError:
+        shape_type = "Unknown"
+    # has_text_frame是固定布尔值（只有<p:sp>为True），图片、连接线、组合等直接跳过文本分析
+    has_text = getattr(shape, 'has_text_frame', False)
+    try:
+        fill = shape.fill
+    except AttributeError:
+        fill = None
+    
     shape_info = {
         "index": shape_idx,
-        "type": str(shape.shape_type) if hasattr(shape, 'shape_type') else "Unknown",
+        "type": shape_type,
         "position": {
-            "left": shape.left,
-            "top": shape.top,
-            "width": shape.width,
-            "height": shape.height
+            "left": _emu_int(shape.left),
+            "top": _emu_int(shape.top),
+            "width": _emu_int(shape.width),
+            "height": _emu_int(shape.height)
         },
-        "has_text": hasattr(shape, 'text'),
+        "has_text": has_text,
         "text_info": None,
         "fill_info": None
     }
     
     # 分析文本信息
-    if hasattr(shape, 'text') and hasattr(shape, 'text_frame'):
+    if has_text:
         shape_info["text_info"] = analyze_text_format(shape)
     
     # 分析填充信息
-    if hasattr(shape, 'fill'):
-        shape_info["fill_info"] = analyze_fill_format(shape.fill)
+    if fill is not None:
+        shape_info["fill_info"] = analyze_fill_format(fill)
     
     return shape_info
 
 def analyze_text_format(shape) -> Dict[str, Any]:
     """分析文本格式"""
+    # shape.text / paragraph.text 每次访问都会重新遍历<a:t>拼接字符串，只读一次
+    text = shape.text
     text_info = {
-        "text_content": shape.text[:100] + "..." if len(shape.text) > 100 else shape.text,
-        "text_length": len(shape.text),
+        "text_content": _trunc(text, 100),
+        "text_length": len(text),
         "paragraphs": []
     }
     
     try:
-        if hasattr(shape, 'text_frame') and shape.text_frame:
-            for para_idx, paragraph in enumerate(shape.text_frame.paragraphs):
-                para_info = {
-                    "index": para_idx,
-                    "text": paragraph.text[:50] + "..." if len(paragraph.text) > 50 else paragraph.text,
-                    "alignment": str(paragraph.alignment) if hasattr(paragraph, 'alignment') else None,
-                    "level": paragraph.level if hasattr(paragraph, 'level') else None,
-                    "font_info": None
-                }
-                
-                # 分析字体
-                if hasattr(paragraph, 'font') and paragraph.font:
-                    para_info["font_info"] = {
-                        "name": paragraph.font.name,
-                        "size": paragraph.font.size.pt if paragraph.font.size else None,
-                        "bold": paragraph.font.bold,
-                        "italic": paragraph.font.italic,
-                        "color": None
-                    }
-                    
-                    # 尝试获取字体颜色
-                    try:
-                        if paragraph.font.color and paragraph.font.color.rgb:
-                            rgb = paragraph.font.color.rgb
-                            para_info["font_info"]["color"] = f"RGB({rgb.red}, {rgb.green}, {rgb.blue})"
-                    except:
-                        para_info["font_info"]["color"] = "Cannot determine"
-                
-                text_info["paragraphs"].append(para_info)
+        paragraphs = shape.text_frame.paragraphs
+        for para_idx, paragraph in enumerate(paragraphs):
+            ptext = paragraph.text
+            para_info = {
+                "index": para_idx,
+                "text": _trunc(ptext, 50),
+                "alignment": _enum_name(paragraph.alignment),
+                "level": paragraph.level,
+                "font_info": None
+            }
+            
+            # 分析字体
+            font = paragraph.font
+            para_info["font_info"] = {
+                "name": font.name,
+                "size": font.size.pt if font.size else None,
+                "bold": font.bold,
+                "italic": font.italic,
+                "color": None
+            }
+            
+            # 尝试获取字体颜色（未设置颜色或主题色时读取rgb会抛AttributeError）
+            try:
+                rgb = font.color.rgb
+            except (AttributeError, ValueError):
+                para_info["font_info"]["color"] = "Cannot determine"
+            else:
+                if rgb:
+                    para_info["font_info"]["color"] = _rgb_str(*rgb)
+            
+            text_info["paragraphs"].append(para_info)
     except Exception as e:
         text_info["error"] = str(e)
     
@@ -178,56 +222,48 @@ def analyze_text_format(shape) -> Dict[str, Any]:
 def analyze_fill_format(fill) -> Dict[str, Any]:
     """分析填充格式"""
     fill_info = {
-        "type": str(fill.type) if hasattr(fill, 'type') else None,
+        "type": _enum_name(fill.type),
         "color": None,
         "transparency": None
     }
     
+    # 非纯色填充读取fore_color会抛TypeError，此时不记录颜色
     try:
-        if hasattr(fill, 'fore_color') and fill.fore_color:
-            try:
-                rgb = fill.fore_color.rgb
-                fill_info["color"] = f"RGB({rgb.red}, {rgb.green}, {rgb.blue})"
-            except:
-                fill_info["color"] = "Cannot determine"
-                
-        if hasattr(fill, 'transparency'):
-            fill_info["transparency"] = fill.transparency
-    except:
-        pass
+        fore_color = fill.fore_color
+    except TypeError:
+        return fill_info
+    
+    # 主题色/未设置颜色时读取rgb会抛AttributeError
+    try:
+        rgb = fore_color.rgb
+    except (AttributeError, ValueError):
+        fill_info["color"] = "Cannot determine"
+    else:
+        fill_info["color"] = _rgb_str(*rgb)
+    
+    fill_info["transparency"] = getattr(fill, 'transparency', None)
     
     return fill_info
 
 def extract_font_statistics(shapes: List[Dict]) -> Dict[str, Any]:
     """提取字体统计信息"""
-    fonts = {}
-    colors = {}
-    sizes = {}
+    # 先展开所有段落的字体信息，再由Counter直接消费过滤后的迭代器（计数循环在C中完成）
+    font_infos = [
+        para["font_info"]
+        for shape in shapes if shape.get("text_info")
+        for para in shape["text_info"].get("paragraphs") or ()
+        if para.get("font_info")
+    ]
     
-    for shape in shapes:
-        if shape.get("text_info") and shape["text_info"].get("paragraphs"):
-            for para in shape["text_info"]["paragraphs"]:
-                font_info = para.get("font_info")
-                if font_info:
-                    # 统计字体名称
-                    font_name = font_info.get("name")
-                    if font_name:
-                        fonts[font_name] = fonts.get(font_name, 0) + 1
-                    
-                    # 统计字体颜色
-                    font_color = font_info.get("color")
-                    if font_color:
-                        colors[font_color] = colors.get(font_color, 0) + 1
-                    
-                    # 统计字体大小
-                    font_size = font_info.get("size")
-                    if font_size:
-                        sizes[str(font_size)] = sizes.get(str(font_size), 0) + 1
+    # 统计字体名称、颜色、大小（忽略空值）
+    fonts = Counter(filter(None, (font_info.get("name") for font_info in font_infos)))
+    colors = Counter(filter(None, (font_info.get("color") for font_info in font_infos)))
+    sizes = Counter(map(str, filter(None, (font_info.get("size") for font_info in font_infos))))
     
     return {
-        "most_common_fonts": sorted(fonts.items(), key=lambda x: x[1], reverse=True)[:5],
-        "most_common_colors": sorted(colors.items(), key=lambda x: x[1], reverse=True)[:5],
-        "most_common_sizes": sorted(sizes.items(), key=lambda x: x[1], reverse=True)[:5]
+        "most_common_fonts": fonts.most_common(5),
+        "most_common_colors": colors.most_common(5),
+        "most_common_sizes": sizes.most_common(5)
     }
 
 def print_analysis_report(analysis: Dict[str, Any]):
@@ -287,12 +323,15 @@ def main():
     analysis = analyze_template_format(template_path)
     print_analysis_report(analysis)
     
-    # 保存分析结果
-    import json
+    # 保存分析结果（优先使用orjson直接输出UTF-8字节，不可用时回退到标准库）
     output_file = "template_format_analysis.json"
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(analysis, f, ensure_ascii=False, indent=2, default=str)
+        if ORJSON_AVAILABLE:
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(analysis, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str))
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, ensure_ascii=False, indent=2, default=str)
         print(f"\n📁 详细分析结果已保存到: {output_file}")
     except Exception as e:
         print(f"❌ 保存分析结果失败: {e}")
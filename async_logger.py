@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+异步日志模块
+用户操作日志放入队列，由后台线程写入，避免日志的磁盘I/O占用请求耗时
+"""
+
+import queue
+import atexit
+import threading
+from typing import Tuple
+from logger import log_user_action
+
+# 待写入的用户操作日志；队列满时直接丢弃，日志永远不阻塞调用方
+_LOG_QUEUE_MAXSIZE = 1000
+_LOG_Q: "queue.Queue[Tuple[str, str]]" = queue.Queue(maxsize=_LOG_QUEUE_MAXSIZE)
+
+
+def _drain() -> None:
+    """后台线程：逐条取出日志写入"""
+    while True:
+        action, details = _LOG_Q.get()
+        try:
+            log_user_action(action, details)
+        except Exception:
+            pass
+        finally:
+            _LOG_Q.task_done()
+
+
+def _flush() -> None:
+    """进程退出时写完队列中剩余的日志（守护线程会随进程直接结束）"""
+    while True:
+        try:
+            action, details = _LOG_Q.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            log_user_action(action, details)
+        except Exception:
+            pass
+
+
+_worker = threading.Thread(target=_drain, name="async-logger", daemon=True)
+_worker.start()
+atexit.register(_flush)
+
+
+def enqueue(action: str, details: str = "") -> None:
+    """记录用户操作（非阻塞），参数与logger.log_user_action一致"""
+    try:
+        _LOG_Q.put_nowait((action, details))
+    except queue.Full:
+        pass
@@ -28,6 +28,8 @@ class Config:
     ai_model: str = "deepseek-v3"
     ai_temperature: float = 0.3
     ai_max_tokens: int = None  # 取消token限制
+    ai_stream_responses: bool = True  # 是否使用流式响应；关闭后一次性返回完整内容（长回复可能触发读取超时）
+    ai_cache_ignore_whitespace: bool = True  # 分页缓存忽略行首尾空白、换行符和多余空行的差异，轻微改动格式后重跑可命中缓存
     
     # 模型选择配置
     available_models: Dict[str, Dict[str, Any]] = field(default_factory=lambda: {
@@ -40,7 +42,9 @@ class Config:
             "api_key_env": "ARK_API_KEY",
             "actual_model": "deepseek-v3-250324",
             "request_format": "streaming_compatible",
-            "use_multiple_keys": True
+            "use_multiple_keys": True,
+            "hedge_fanout": 1,  # 同时请求的密钥数，>1时对冲请求取最快结果（会成倍消耗调用额度）
+            "json_mode": False  # 为True时请求response_format=json_object，回复不带代码块可直接解析（需服务端支持）
         },
         "liai-chat": {
             "name": "Liai Chat（保密信息请选择此模型）",
@@ -52,7 +56,8 @@ class Config:
             "api_key_url": "https://liai-app.chj.cloud",
             "chat_endpoint": "/chat-messages",
             "request_format": "dify_compatible",
-            "use_multiple_keys": True
+            "use_multiple_keys": True,
+            "gzip_request": False  # 为True时请求体以gzip压缩上传（需服务端支持Content-Encoding: gzip）
         },
     })
     
@@ -170,6 +175,8 @@ class Config:
             'ai_model': self.ai_model,
             'ai_temperature': self.ai_temperature,
             'ai_max_tokens': self.ai_max_tokens,
+            'ai_stream_responses': self.ai_stream_responses,
+            'ai_cache_ignore_whitespace': self.ai_cache_ignore_whitespace,
             'max_file_size_mb': self.max_file_size_mb,
             'supported_formats': self.supported_formats,
             'log_level': self.log_level,
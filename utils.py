@@ -9,14 +9,44 @@ import os
 import re
 import json
 import time
+import requests
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
 from openai import OpenAI
 from pptx import Presentation
 from pptx.util import Inches, Pt
+from pptx.dml.color import RGBColor
 from config import get_config
 from ppt_beautifier import PPTBeautifier
 
+def _extract_fenced_json(content: str) -> Optional[str]:
+    """
+    提取AI回复中```json代码块里的JSON对象，没有时返回None
+
+    只用str.find定位代码块标记，不会出现正则回溯；结果与
+    re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)的分组一致
+    """
+    length = len(content)
+    fence = content.find('```')
+    while fence >= 0:
+        start = fence + 3
+        if content.startswith('json', start):
+            start += 4
+        while start < length and content[start].isspace():
+            start += 1
+        
+        if start < length and content[start] == '{':
+            # 找到第一个前面（忽略空白）是}的结束标记
+            end = content.find('```', start + 1)
+            while end >= 0:
+                body = content[start:end].rstrip()
+                if len(body) > 1 and body.endswith('}'):
+                    return body
+                end = content.find('```', end + 1)
+        
+        fence = content.find('```', fence + 1)
+    return None
+
 class PPTAnalyzer:
     """PPT分析器"""
     
@@ -147,7 +177,6 @@ class AIProcessor:
             # 检查模型配置中的环境变量设置
             api_key_env = model_info.get('api_key_env')
             if api_key_env:
-                import os
                 # 如果支持多密钥，获取所有可用密钥
                 if model_info.get('use_multiple_keys'):
                     self.api_keys = []
@@ -282,8 +311,6 @@ class AIProcessor:
     
     def _call_liai_api(self, system_prompt: str, user_text: str) -> str:
         """调用Liai API（带故障转移的多密钥负载均衡）"""
-        import requests
-        import json
         
         model_info = self.config.get_model_info()
         base_url = model_info.get('base_url', '')
@@ -437,7 +464,6 @@ class AIProcessor:
         Returns:
             List[Dict]: 处理结果列表
         """
-        import time
         
         results = []
         total_requests = len(requests_data)
@@ -501,7 +527,6 @@ class AIProcessor:
         Returns:
             List[Dict]: 每页的分析结果
         """
-        import time
         
         results = []
         total_pages = len(pages_data)
@@ -638,7 +663,6 @@ class AIProcessor:
         name_lower = placeholder_name.lower()
         
         # 分析复合占位符的所有组件
-        import re
         components = re.split(r'[_\-\s]+', name_lower)
         all_components = [name_lower] + components
         
@@ -692,7 +716,6 @@ class AIProcessor:
         
         # 分析复合占位符的所有组件
         # 使用下划线、连字符等分隔符分割占位符名称
-        import re
         components = re.split(r'[_\-\s]+', name_lower)
         all_components = [name_lower] + components  # 包含完整名称和所有组件
         
@@ -881,9 +904,9 @@ class AIProcessor:
     def _extract_json_from_response(self, content: str, user_text: str) -> Dict[str, Any]:
         """从AI响应中提取JSON"""
         # 提取JSON内容（如果有代码块包围）
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
-        if json_match:
-            content = json_match.group(1)
+        fenced_json = _extract_fenced_json(content)
+        if fenced_json is not None:
+            content = fenced_json
         
         try:
             # 确保content是UTF-8编码的字符串
@@ -1475,8 +1498,6 @@ class PPTProcessor:
     def _apply_format_to_cell(self, cell, format_info: Dict[str, Any]):
         """应用格式到表格单元格"""
         try:
-            from pptx.util import Pt
-            from pptx.dml.color import RGBColor
             if hasattr(cell, 'text_frame') and cell.text_frame:
                 for paragraph in cell.text_frame.paragraphs:
                     font = paragraph.font
@@ -1513,8 +1534,6 @@ class PPTProcessor:
     def _apply_format_to_run(self, run, format_info: Dict[str, Any]):
         """应用格式到run"""
         try:
-            from pptx.util import Pt
-            from pptx.dml.color import RGBColor
             font = run.font
             print(f"      应用格式 - 字体:{format_info.get('font_name')}, 大小:{format_info.get('font_size')}, 颜色:{format_info.get('font_color')}")
             
@@ -1559,8 +1578,6 @@ class PPTProcessor:
     def _apply_format_to_shape_text(self, shape, format_info: Dict[str, Any], new_content: str):
         """应用格式到文本框中替换的内容"""
         try:
-            from pptx.util import Pt
-            from pptx.dml.color import RGBColor
             if hasattr(shape, 'text_frame') and shape.text_frame:
                 # 直接对整个文本框的所有runs应用格式（因为shape.text替换会重建runs结构）
                 for paragraph in shape.text_frame.paragraphs:
@@ -1600,7 +1617,6 @@ class PPTProcessor:
     def _apply_cached_format_to_shape(self, shape, cached_format: Dict[str, Any]):
         """将缓存的格式应用到shape的所有文本"""
         try:
-            from pptx.util import Pt
             if hasattr(shape, 'text_frame') and shape.text_frame:
                 for paragraph in shape.text_frame.paragraphs:
                     font = paragraph.font